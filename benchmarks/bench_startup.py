@@ -0,0 +1,125 @@
+"""
+Cold-start benchmark for the API.
+
+Measures, each in a fresh interpreter:
+  * import time of src.main (what every container restart pays)
+  * import + build time of the agent graph (now deferred to first use)
+  * time-to-first-response: process spawn until /health answers, with the
+    startup prewarm on and off
+  * optionally, latency of the first /agent/invoke after startup
+
+Usage (from the repository root):
+    python -m benchmarks.bench_startup --runs 5 --output startup.json
+    python -m benchmarks.bench_startup --invoke-message 'What is finding HK-2024-001?'
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def bench_env(**overrides) -> dict:
+    env = dict(os.environ)
+    env.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+    env.update(overrides)
+    return env
+
+
+def time_import(statement: str, runs: int) -> dict:
+    """Median wall time of running `statement` in a fresh interpreter."""
+    code = (
+        'import time; t = time.perf_counter(); '
+        f'{statement}; print(time.perf_counter() - t)'
+    )
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=bench_env(),
+                             capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return {'median_s': round(statistics.median(samples), 4),
+            'min_s': round(min(samples), 4), 'runs': runs}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def http(method: str, url: str, body: dict = None, timeout: float = 120) -> dict:
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method,
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read())
+
+
+def time_first_response(prewarm: bool, invoke_message: str = None,
+                        timeout: float = 120) -> dict:
+    """Spawn uvicorn and time until /health (and optionally /agent/invoke) answers."""
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    env = bench_env(PREWARM_ON_STARTUP=str(prewarm).lower())
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'src.main:app', '--port', str(port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        result = {'prewarm': prewarm}
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError('API process exited during startup')
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError('API did not become healthy in time')
+            try:
+                health = http('GET', f'{base}/health', timeout=1)
+                break
+            except OSError:
+                time.sleep(0.02)
+        result['time_to_health_s'] = round(time.perf_counter() - start, 4)
+        result['warmup'] = health.get('warmup', {})
+        if invoke_message:
+            t = time.perf_counter()
+            http('POST', f'{base}/agent/invoke', {
+                'message': invoke_message, 'thread_id': f'bench-{port}'
+            }, timeout=timeout)
+            result['first_invoke_s'] = round(time.perf_counter() - t, 4)
+            result['time_to_first_invoke_s'] = round(time.perf_counter() - start, 4)
+        return result
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--invoke-message', default=None,
+                        help='Also time the first /agent/invoke (needs OpenAI + Qdrant)')
+    parser.add_argument('--output', default=None, help='Write results as JSON')
+    args = parser.parse_args()
+
+    results = {
+        'import_src_main': time_import('import src.main', args.runs),
+        'import_and_build_graph': time_import(
+            'from src.agent.graph import get_agent_graph; get_agent_graph()', args.runs),
+        'first_response': [
+            time_first_response(prewarm=False, invoke_message=args.invoke_message),
+            time_first_response(prewarm=True, invoke_message=args.invoke_message),
+        ],
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,417 @@
+"""
+End-to-end load test for the FastAPI service.
+
+Replays a configurable mix of operations at a target arrival rate (open
+loop, Poisson arrivals) and reports throughput, p50/p95/p99 latency,
+time-to-first-SSE-event and error rates per operation.
+
+By default it spawns everything locally: an OpenAI stub
+(benchmarks/stub_openai.py), the API with in-memory Qdrant, and a seed
+corpus built from tests/sample_docs. Use --base-url to target an already
+running deployment instead.
+
+Operations in --mix:
+    simple    direct question          (invoke or stream, see --stream-ratio)
+    complex   report task              (invoke or stream)
+    approval  report task, then /agent/approve on the same thread
+    upload    /documents/upload of a sample document
+
+Usage (from the repository root):
+    python -m benchmarks.load_test --rate 5 --duration 60 --output v1.json
+    python -m benchmarks.load_test --rate 5 --duration 60 --compare v1.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+SAMPLE_DOCS = ROOT / 'tests' / 'sample_docs'
+
+SIMPLE_QUESTIONS = [
+    'What is finding HK-2024-001?',
+    'Who owns the AML transaction monitoring finding?',
+    'What is the target date for SG-2024-003?',
+    'Which MAS reference applies to the PDPA data retention finding?',
+]
+COMPLEX_TASKS = [
+    'Review all critical findings and identify compliance gaps, then prepare a report',
+    'Compare the Hong Kong and Singapore findings and prepare a summary report',
+]
+
+
+# ── Local stack ─────────────────────────────────────────────────────
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def make_pdf(text: str) -> bytes:
+    """Build a minimal one-font PDF with one line of text per source line."""
+    lines = text.splitlines()[:60]
+    escaped = [line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+               for line in lines]
+    ops = ['BT', '/F1 9 Tf', '11 TL', '40 800 Td']
+    ops += [f'({line.encode("latin-1", "replace").decode("latin-1")}) Tj T*'
+            for line in escaped]
+    ops.append('ET')
+    stream = '\n'.join(ops).encode('latin-1', 'replace')
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+        b'/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>',
+        b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % i + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % off for off in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+        len(objects) + 1, xref)
+    return bytes(out)
+
+
+def sample_pdfs() -> list:
+    return [(path.with_suffix('.pdf').name, make_pdf(path.read_text()))
+            for path in sorted(SAMPLE_DOCS.glob('*.txt'))]
+
+
+def wait_healthy(url: str, proc: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'Process serving {url} exited during startup')
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError(f'{url} did not become healthy in {timeout}s')
+
+
+def spawn_local_stack(args) -> tuple:
+    """
+    Start the OpenAI stub and the API (in-memory Qdrant, or a fresh embedded
+    index with --vector-backend embedded). Returns (base_url, procs).
+    """
+    stub_port, api_port = free_port(), free_port()
+    log = None if args.verbose else subprocess.DEVNULL
+    stub_env = dict(os.environ,
+                    STUB_CHAT_LATENCY_MS=str(args.stub_chat_latency_ms),
+                    STUB_EMBED_LATENCY_MS=str(args.stub_embed_latency_ms))
+    stub = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'benchmarks.stub_openai:app',
+         '--port', str(stub_port), '--log-level', 'warning'],
+        cwd=ROOT, env=stub_env, stdout=log, stderr=log)
+    procs = [stub]
+    try:
+        wait_healthy(f'http://127.0.0.1:{stub_port}/v1/models', stub)
+        api_env = dict(os.environ,
+                       OPENAI_API_KEY='sk-stub',
+                       OPENAI_BASE_URL=f'http://127.0.0.1:{stub_port}/v1',
+                       QDRANT_HOST=':memory:',
+                       VECTOR_BACKEND=args.vector_backend,
+                       EMBEDDED_INDEX_PATH=tempfile.mkdtemp(prefix='embedded_index_'),
+                       USE_GUARDRAILS='false',
+                       LANGCHAIN_TRACING_V2='false')
+        api = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'src.main:app',
+             '--port', str(api_port), '--log-level', 'warning'],
+            cwd=ROOT, env=api_env, stdout=log, stderr=log)
+        procs.append(api)
+        base_url = f'http://127.0.0.1:{api_port}'
+        wait_healthy(f'{base_url}/health', api)
+    except Exception:
+        stop(procs)
+        raise
+    return base_url, procs
+
+
+def stop(procs: list):
+    for proc in procs:
+        proc.terminate()
+    for proc in procs:
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+# ── Operations ──────────────────────────────────────────────────────
+
+class Recorder:
+    """Collects per-operation latencies, errors and time-to-first-event."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, op: str, latency: float, ok: bool, ttfe: float = None, error: str = None):
+        entry = self.samples.setdefault(op, {'latency': [], 'ttfe': [], 'errors': {}})
+        if ok:
+            entry['latency'].append(latency)
+            if ttfe is not None:
+                entry['ttfe'].append(ttfe)
+        else:
+            entry['errors'][error] = entry['errors'].get(error, 0) + 1
+
+
+async def invoke(client, message: str, thread_id: str) -> dict:
+    resp = await client.post('/agent/invoke',
+                             json={'message': message, 'thread_id': thread_id})
+    resp.raise_for_status()
+    return resp.json()
+
+
+class CheckFailed(RuntimeError):
+    """The API answered 200 but not with what the operation requires."""
+
+
+async def stream(client, message: str, thread_id: str) -> tuple:
+    """Consume one SSE stream. Returns (time_to_first_event, paused_for_approval)."""
+    started = time.perf_counter()
+    ttfe, paused = None, False
+    async with client.stream('POST', '/agent/stream',
+                             json={'message': message, 'thread_id': thread_id}) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if line.startswith('data: '):
+                if ttfe is None:
+                    ttfe = time.perf_counter() - started
+                event = json.loads(line[6:])
+                if event.get('error'):
+                    raise RuntimeError(f"agent error: {event['error']}")
+                paused = paused or event.get('node') == '__interrupt__'
+    if ttfe is None:
+        raise RuntimeError('stream ended without events')
+    return ttfe, paused
+
+
+async def run_operation(client, op: str, args, recorder: Recorder, pdfs: list):
+    thread_id = f'load-{uuid.uuid4().hex[:12]}'
+    use_stream = op != 'upload' and random.random() < args.stream_ratio
+    name = f'{op}/{"stream" if use_stream else "invoke"}' if op != 'upload' else 'upload'
+    started = time.perf_counter()
+    ttfe = None
+    try:
+        if op == 'upload':
+            filename, content = random.choice(pdfs)
+            resp = await client.post(
+                '/documents/upload',
+                files={'file': (f'{uuid.uuid4().hex[:6]}-{filename}', content,
+                                'application/pdf')},
+                data={'summarize': str(args.summarize).lower()})
+            resp.raise_for_status()
+        else:
+            message = random.choice(SIMPLE_QUESTIONS if op == 'simple' else COMPLEX_TASKS)
+            if use_stream:
+                ttfe, paused = await stream(client, message, thread_id)
+            else:
+                result = await invoke(client, message, thread_id)
+                paused = result.get('pending_action') == 'human_review'
+            if op == 'approval':
+                # Only a real pause -> resume round trip counts as an approval
+                if not paused:
+                    raise CheckFailed('run did not pause for approval')
+                resp = await client.post('/agent/approve', json={
+                    'thread_id': thread_id, 'decision': 'approved',
+                    'reviewer_name': 'load-test'})
+                resp.raise_for_status()
+                resumed = resp.json()
+                if ('Human approval granted' not in resumed.get('steps_taken', [])
+                        or not resumed.get('response')):
+                    raise CheckFailed('approve did not resume the run')
+        recorder.add(name, time.perf_counter() - started, True, ttfe=ttfe)
+    except httpx.HTTPStatusError as e:
+        recorder.add(name, time.perf_counter() - started, False,
+                     error=f'HTTP {e.response.status_code}')
+    except CheckFailed as e:
+        recorder.add(name, time.perf_counter() - started, False, error=str(e))
+    except Exception as e:
+        recorder.add(name, time.perf_counter() - started, False, error=type(e).__name__)
+
+
+async def seed(client, pdfs: list, summarize: bool):
+    for filename, content in pdfs:
+        resp = await client.post('/documents/upload',
+                                 files={'file': (filename, content, 'application/pdf')},
+                                 data={'summarize': str(summarize).lower()})
+        resp.raise_for_status()
+
+
+async def generate_load(base_url: str, args) -> dict:
+    mix = parse_mix(args.mix)
+    ops, weights = list(mix), list(mix.values())
+    recorder = Recorder()
+    pdfs = sample_pdfs()
+    limits = httpx.Limits(max_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout,
+                                 limits=limits) as client:
+        if args.seed:
+            await seed(client, pdfs, args.summarize)
+        in_flight = asyncio.Semaphore(args.max_in_flight)
+        tasks, dropped = [], 0
+
+        async def guarded(op):
+            async with in_flight:
+                await run_operation(client, op, args, recorder, pdfs)
+
+        started = time.perf_counter()
+        next_arrival = started
+        while True:
+            next_arrival += random.expovariate(args.rate)
+            if next_arrival - started > args.duration:
+                break
+            await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+            if in_flight.locked():
+                dropped += 1       # client-side cap reached: count, don't queue
+                continue
+            op = random.choices(ops, weights)[0]
+            tasks.append(asyncio.create_task(guarded(op)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    return summarise(recorder, elapsed, args, dropped)
+
+
+# ── Reporting ───────────────────────────────────────────────────────
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(','):
+        op, _, weight = part.partition('=')
+        if op not in ('simple', 'complex', 'approval', 'upload'):
+            raise ValueError(f'Unknown operation in --mix: {op}')
+        mix[op] = float(weight or 1)
+    return mix
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return round(ordered[index] * 1000, 1)
+
+
+def summarise(recorder: Recorder, elapsed: float, args, dropped: int) -> dict:
+    operations = {}
+    total_ok = total_err = 0
+    for name, entry in sorted(recorder.samples.items()):
+        ok, errors = len(entry['latency']), sum(entry['errors'].values())
+        total_ok, total_err = total_ok + ok, total_err + errors
+        operations[name] = {
+            'requests': ok + errors,
+            'errors': errors,
+            'error_rate': round(errors / (ok + errors), 4),
+            'throughput_rps': round(ok / elapsed, 3),
+            'latency_ms': {p: percentile(entry['latency'], n)
+                           for p, n in (('p50', 50), ('p95', 95), ('p99', 99))},
+            'error_types': entry['errors'],
+        }
+        if entry['ttfe']:
+            operations[name]['ttfe_ms'] = {p: percentile(entry['ttfe'], n)
+                                           for p, n in (('p50', 50), ('p95', 95), ('p99', 99))}
+    return {
+        'config': {'rate': args.rate, 'duration_s': args.duration, 'mix': args.mix,
+                   'stream_ratio': args.stream_ratio, 'max_in_flight': args.max_in_flight,
+                   'target': args.base_url or 'local-stub'},
+        'elapsed_s': round(elapsed, 2),
+        'requests': total_ok + total_err,
+        'throughput_rps': round(total_ok / elapsed, 3),
+        'error_rate': round(total_err / max(1, total_ok + total_err), 4),
+        'dropped_client_side': dropped,
+        'operations': operations,
+    }
+
+
+def print_report(results: dict, baseline: dict = None):
+    def fmt(value, base=None):
+        if value is None:
+            return '-'
+        if base is None:
+            return f'{value}'
+        if base:
+            return f'{value} ({(value - base) / base * 100:+.0f}%)'
+        return f'{value}'
+
+    base_ops = (baseline or {}).get('operations', {})
+    print(f"\n{results['requests']} requests in {results['elapsed_s']}s | "
+          f"{results['throughput_rps']} req/s | error rate {results['error_rate']:.2%} | "
+          f"dropped {results['dropped_client_side']}")
+    header = f"{'operation':<18}{'n':>6}{'err%':>8}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}{'TTFE p50':>18}"
+    print(header)
+    print('-' * len(header))
+    for name, op in results['operations'].items():
+        base = base_ops.get(name, {})
+        lat, base_lat = op['latency_ms'], base.get('latency_ms', {})
+        ttfe = op.get('ttfe_ms', {}).get('p50')
+        base_ttfe = base.get('ttfe_ms', {}).get('p50') if baseline else None
+        print(f"{name:<18}{op['requests']:>6}{op['error_rate'] * 100:>7.1f}%"
+              f"{fmt(lat['p50'], base_lat.get('p50')):>18}"
+              f"{fmt(lat['p95'], base_lat.get('p95')):>18}"
+              f"{fmt(lat['p99'], base_lat.get('p99')):>18}"
+              f"{fmt(ttfe, base_ttfe):>18}")
+        if op['error_types']:
+            print(f"{'':<18}errors: {op['error_types']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--base-url', default=None,
+                        help='Target a running API instead of spawning the local stub stack')
+    parser.add_argument('--rate', type=float, default=2.0, help='Arrivals per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds of load')
+    parser.add_argument('--mix', default='simple=6,complex=2,approval=1,upload=1',
+                        help='Weighted operation mix, e.g. simple=6,complex=2,approval=1,upload=1')
+    parser.add_argument('--stream-ratio', type=float, default=0.5,
+                        help='Share of questions sent to /agent/stream instead of /agent/invoke')
+    parser.add_argument('--max-in-flight', type=int, default=200,
+                        help='Client-side cap on concurrent requests')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--no-seed', dest='seed', action='store_false',
+                        help='Skip uploading the sample corpus before the run')
+    parser.add_argument('--no-summarize', dest='summarize', action='store_false',
+                        help='Upload without building the summary index')
+    parser.add_argument('--vector-backend', default='qdrant', choices=['qdrant', 'embedded'],
+                        help='Retrieval backend for the spawned API')
+    parser.add_argument('--stub-chat-latency-ms', type=int, default=300)
+    parser.add_argument('--stub-embed-latency-ms', type=int, default=30)
+    parser.add_argument('--output', default=None, help='Write results as JSON')
+    parser.add_argument('--compare', default=None, help='Baseline JSON to diff against')
+    parser.add_argument('--verbose', action='store_true', help='Show stub/API logs')
+    args = parser.parse_args()
+
+    procs = []
+    base_url = args.base_url
+    if base_url is None:
+        base_url, procs = spawn_local_stack(args)
+    try:
+        results = asyncio.run(generate_load(base_url, args))
+    finally:
+        stop(procs)
+
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(results, baseline)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Minimal OpenAI-compatible stub for load tests.
+
+Serves /v1/chat/completions, /v1/embeddings and /v1/models with a fixed,
+configurable latency so the API can be load-tested without spending
+tokens. Point the API at it with OPENAI_BASE_URL=http://host:port/v1.
+
+    STUB_CHAT_LATENCY_MS   delay per chat completion (default 300)
+    STUB_EMBED_LATENCY_MS  delay per embeddings request (default 30)
+
+Embeddings are deterministic hashed bag-of-words vectors, so questions
+that share words with a chunk still retrieve it.
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import re
+import time
+import numpy as np
+from fastapi import FastAPI, Request
+
+EMBEDDING_DIM = 1536
+CHAT_LATENCY_S = float(os.getenv('STUB_CHAT_LATENCY_MS', '300')) / 1000
+EMBED_LATENCY_S = float(os.getenv('STUB_EMBED_LATENCY_MS', '30')) / 1000
+COMPLEX_HINTS = ('report', 'review', 'identify', 'prepare', 'analy', 'compare', 'summar')
+
+app = FastAPI(title='OpenAI stub')
+
+
+def embed(item) -> np.ndarray:
+    # The SDK may send raw text or pre-tokenised input (lists of token IDs)
+    words = re.findall(r'\w+', item.lower()) if isinstance(item, str) else [str(t) for t in item]
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for word in words:
+        vector[int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % EMBEDDING_DIM] += 1
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def count_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+@app.get('/v1/models')
+async def models():
+    return {'object': 'list', 'data': [
+        {'id': 'stub', 'object': 'model', 'created': 0, 'owned_by': 'stub'}
+    ]}
+
+
+@app.post('/v1/embeddings')
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body['input']
+    if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    await asyncio.sleep(EMBED_LATENCY_S)
+    data = []
+    for i, item in enumerate(inputs):
+        vector = embed(item)
+        if body.get('encoding_format') == 'base64':
+            encoded = base64.b64encode(vector.astype('<f4').tobytes()).decode()
+        else:
+            encoded = vector.tolist()
+        data.append({'object': 'embedding', 'index': i, 'embedding': encoded})
+    tokens = sum(len(item) if not isinstance(item, str) else count_tokens(item)
+                 for item in inputs)
+    return {'object': 'list', 'data': data, 'model': body.get('model', 'stub'),
+            'usage': {'prompt_tokens': tokens, 'total_tokens': tokens}}
+
+
+@app.post('/v1/chat/completions')
+async def chat_completions(request: Request):
+    body = await request.json()
+    prompt = '\n'.join(str(m.get('content', '')) for m in body.get('messages', []))
+    await asyncio.sleep(CHAT_LATENCY_S)
+    if 'Classify this user message' in prompt:
+        message = prompt.split('User message:')[-1].lower()
+        content = 'complex' if any(h in message for h in COMPLEX_HINTS) else 'simple'
+    else:
+        content = ('Stub answer. Finding HK-2024-001 is a critical trade reconciliation '
+                   'control gap owned by Alice Chen, due 2026-03-15, status In Progress.')
+    prompt_tokens, completion_tokens = count_tokens(prompt), count_tokens(content)
+    return {
+        'id': f'chatcmpl-stub-{time.time_ns()}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', 'stub'),
+        'choices': [{'index': 0, 'finish_reason': 'stop',
+                     'message': {'role': 'assistant', 'content': content}}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                  'total_tokens': prompt_tokens + completion_tokens},
+    }
@@ -4,6 +4,7 @@ import json
 import uuid
 
 API_URL = 'http://api:8000'
+STREAM_MAX_RECONNECTS = 3
 
 st.title('💬 Agent Chat')
 
@@ -43,25 +44,35 @@ if st.session_state.pending_approval:
                 'decision': 'approved',
                 'reviewer_name': 'Auditor'
             })
-            data = resp.json()
-            st.session_state.messages.append({
-                'role': 'assistant',
-                'content': data.get('response', 'Report generation approved.')
-            })
-            st.session_state.pending_approval = False
-            st.rerun()
+            if resp.status_code in (429, 503):
+                # Still paused: keep the buttons so the reviewer can retry
+                st.error(f"⏳ The server is busy ({resp.status_code}). Please retry in "
+                         f"{resp.headers.get('Retry-After', '30')} s.")
+            else:
+                data = resp.json()
+                st.session_state.messages.append({
+                    'role': 'assistant',
+                    'content': data.get('response') or data.get('detail')
+                    or 'Report generation approved.'
+                })
+                st.session_state.pending_approval = False
+                st.rerun()
     with col2:
         if st.button('❌ Reject', type='secondary'):
-            requests.post(f'{API_URL}/agent/approve', json={
+            resp = requests.post(f'{API_URL}/agent/approve', json={
                 'thread_id': st.session_state.thread_id,
                 'decision': 'rejected',
                 'reviewer_name': 'Auditor'
             })
-            st.session_state.messages.append({
-                'role': 'assistant', 'content': 'Report generation rejected.'
-            })
-            st.session_state.pending_approval = False
-            st.rerun()
+            if resp.status_code in (429, 503):
+                st.error(f"⏳ The server is busy ({resp.status_code}). Please retry in "
+                         f"{resp.headers.get('Retry-After', '30')} s.")
+            else:
+                st.session_state.messages.append({
+                    'role': 'assistant', 'content': 'Report generation rejected.'
+                })
+                st.session_state.pending_approval = False
+                st.rerun()
 
 # Chat input
 if prompt := st.chat_input('Ask about audit findings or give the agent a task...'):
@@ -76,30 +87,63 @@ if prompt := st.chat_input('Ask about audit findings or give the agent a task...
         steps_so_far = []
         final_response = ''
         needs_approval = False
+        notice = ''
 
-        with requests.post(
-            f'{API_URL}/agent/stream',
-            json={
-                'message': prompt,
-                'thread_id': st.session_state.thread_id,
-                'require_approval': True
-            },
-            stream=True,
-            timeout=60
-        ) as resp:
-            for line in resp.iter_lines():
-                if line and line.startswith(b'data: '):
-                    data = json.loads(line[6:])
-                    steps_so_far.extend(data.get('steps', []))
-                    if steps_so_far:
-                        steps_placeholder.info(
-                            'Agent steps: ' + ' → '.join(steps_so_far[-3:])
-                        )
-                    if data.get('response'):
-                        final_response = data['response']
-                        response_placeholder.markdown(final_response)
-                    if data.get('needs_approval'):
-                        needs_approval = True
+        # Resume the same server-side run after a timeout or dropped
+        # connection instead of re-running the agent from scratch.
+        last_event_id = None
+        for attempt in range(STREAM_MAX_RECONNECTS + 1):
+            headers = {'Last-Event-ID': last_event_id} if last_event_id else {}
+            try:
+                with requests.post(
+                    f'{API_URL}/agent/stream',
+                    json={
+                        'message': prompt,
+                        'thread_id': st.session_state.thread_id,
+                        'require_approval': True
+                    },
+                    headers=headers,
+                    stream=True,
+                    timeout=60
+                ) as resp:
+                    if resp.status_code == 410:
+                        notice = ('The agent run expired before it could be resumed. '
+                                  'Please send your message again.')
+                        st.error(notice)
+                        break
+                    if resp.status_code in (429, 503):
+                        # Shed by the API's admission control: nothing ran
+                        retry_after = resp.headers.get('Retry-After', '30')
+                        notice = (f'⏳ The server is busy ({resp.status_code}). '
+                                  f'Please retry in {retry_after} s.')
+                        st.error(notice)
+                        break
+                    for line in resp.iter_lines():
+                        if line and line.startswith(b'id: '):
+                            last_event_id = line[4:].decode()
+                        elif line and line.startswith(b'data: '):
+                            data = json.loads(line[6:])
+                            steps_so_far.extend(data.get('steps', []))
+                            if steps_so_far:
+                                steps_placeholder.info(
+                                    'Agent steps: ' + ' → '.join(steps_so_far[-3:])
+                                )
+                            if data.get('response'):
+                                final_response = data['response']
+                                response_placeholder.markdown(final_response)
+                            if data.get('needs_approval'):
+                                needs_approval = True
+                            if data.get('error'):
+                                st.error(f"Agent error: {data['error']}")
+                break
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError):
+                if attempt == STREAM_MAX_RECONNECTS:
+                    notice = 'Lost connection to the agent. Please try again.'
+                    st.error(notice)
+                    break
+                steps_placeholder.info('Connection lost — resuming agent stream...')
 
         st.session_state.agent_steps = steps_so_far
         if needs_approval:
@@ -112,4 +156,7 @@ if prompt := st.chat_input('Ask about audit findings or give the agent a task...
             st.session_state.messages.append({
                 'role': 'assistant', 'content': final_response
             })
+        elif notice:
+            # Kept in the history so it survives the rerun below
+            st.session_state.messages.append({'role': 'assistant', 'content': notice})
         st.rerun()
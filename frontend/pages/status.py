@@ -1,4 +1,9 @@
 import streamlit as st
+import requests
+import pandas as pd
+import altair as alt
+
+API_URL = 'http://api:8000'
 
 st.title('🔍 Agent Execution Trace')
 st.markdown('See exactly what the agent did step by step in your last conversation.')
@@ -11,3 +16,66 @@ else:
         st.markdown(f'**{i}.** {step}')
     if st.session_state.get('pending_approval'):
         st.warning('Agent is currently paused — waiting for human approval.')
+
+# Timing waterfall: one bar per span (graph node, tool, LLM call, Qdrant op)
+st.markdown('### Timing waterfall')
+thread_id = st.session_state.get('thread_id')
+spans = []
+if thread_id:
+    try:
+        resp = requests.get(f'{API_URL}/agent/trace/{thread_id}', timeout=10)
+        spans = resp.json().get('spans', [])
+    except requests.exceptions.RequestException as e:
+        st.error(f'Could not load trace from the API: {e}')
+
+if not spans:
+    st.info('No timing data recorded for this session yet.')
+else:
+    # Each request (invoke / stream / approve) is its own trace
+    trace_ids = list(dict.fromkeys(s['trace_id'] for s in spans))
+    labels = {tid: f"Run {i} — {next(s['name'] for s in spans if s['trace_id'] == tid)}"
+              for i, tid in enumerate(trace_ids, 1)}
+    selected = st.selectbox('Request', trace_ids[::-1], format_func=labels.get)
+    run_spans = [s for s in spans if s['trace_id'] == selected]
+
+    by_id = {s['span_id']: s for s in run_spans}
+
+    def depth(s):
+        d = 0
+        while s['parent_id'] in by_id:
+            s, d = by_id[s['parent_id']], d + 1
+        return d
+
+    t0 = min(s['start'] for s in run_spans)
+    rows = []
+    for i, s in enumerate(run_spans):
+        start_ms = (s['start'] - t0) * 1000
+        rows.append({
+            'order': i,
+            'span': f"{'· ' * depth(s)}{s['name']}",
+            'kind': s['kind'],
+            'start_ms': round(start_ms, 1),
+            'end_ms': round(start_ms + (s['duration_ms'] or 0), 1),
+            'duration_ms': s['duration_ms'],
+            'status': s['status'],
+            'details': ', '.join(f'{k}={v}' for k, v in s['attributes'].items()
+                                 if v is not None),
+        })
+    df = pd.DataFrame(rows)
+
+    total_ms = df['end_ms'].max()
+    st.metric('Total time', f'{total_ms / 1000:.2f} s')
+    chart = alt.Chart(df).mark_bar().encode(
+        x=alt.X('start_ms:Q', title='Time since request start (ms)'),
+        x2='end_ms:Q',
+        y=alt.Y('span:N', sort=alt.EncodingSortField(field='order'), title=None),
+        color=alt.Color('kind:N', title='Kind'),
+        tooltip=['span', 'kind', 'duration_ms', 'status', 'details'],
+    ).properties(height=max(200, 28 * len(df)))
+    st.altair_chart(chart, use_container_width=True)
+
+    slowest = df.sort_values('duration_ms', ascending=False)
+    slowest = slowest[slowest['kind'] != 'request'].head(5)
+    st.markdown('**Slowest spans**')
+    st.dataframe(slowest[['span', 'kind', 'duration_ms', 'status', 'details']],
+                 hide_index=True, use_container_width=True)
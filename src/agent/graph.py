@@ -1,7 +1,9 @@
+from functools import lru_cache
 from langgraph.graph import StateGraph, START, END
 from langgraph.checkpoint.memory import MemorySaver
 from src.agent.state import AgentState
 from src.agent import nodes
+from src.services.tracing import traced_node
 
 
 def route_after_classify(state: AgentState) -> str:
@@ -15,6 +17,16 @@ def route_after_classify(state: AgentState) -> str:
     return 'plan_steps'
 
 
+def route_after_retrieval(state: AgentState) -> str:
+    """
+    Simple path: only spend an LLM call when retrieval found something
+    relevant; otherwise answer from the not-found template.
+    """
+    if state.get('retrieval_status') == 'ok':
+        return 'generate_response'
+    return 'not_found'
+
+
 def route_after_planning(state: AgentState) -> str:
     """
     After planning, check if we need human approval.
@@ -30,15 +42,17 @@ def build_agent_graph():
     # Create the graph builder with our state type
     builder = StateGraph(AgentState)
 
-    # Register all nodes (functions from nodes.py)
-    builder.add_node('classify_question',  nodes.classify_question)
-    builder.add_node('fast_rag',            nodes.fast_rag)
-    builder.add_node('plan_steps',          nodes.plan_steps)
-    builder.add_node('search_docs',         nodes.search_docs)
-    builder.add_node('check_compliance',    nodes.check_compliance)
-    builder.add_node('check_deadlines',     nodes.check_deadlines)
-    builder.add_node('human_review',        nodes.human_review_node)
-    builder.add_node('generate_response',   nodes.generate_response)
+    # Register all nodes (functions from nodes.py), each timed as a trace span
+    builder.add_node('classify_question',  traced_node('classify_question', nodes.classify_question))
+    builder.add_node('fast_rag',            traced_node('fast_rag', nodes.fast_rag))
+    builder.add_node('not_found',           traced_node('not_found', nodes.not_found))
+    builder.add_node('plan_steps',          traced_node('plan_steps', nodes.plan_steps))
+    builder.add_node('search_docs',         traced_node('search_docs', nodes.search_docs))
+    builder.add_node('check_compliance',    traced_node('check_compliance', nodes.check_compliance))
+    builder.add_node('check_deadlines',     traced_node('check_deadlines', nodes.check_deadlines))
+    builder.add_node('approval_gate',       traced_node('approval_gate', nodes.approval_gate))
+    builder.add_node('human_review',        traced_node('human_review', nodes.human_review_node))
+    builder.add_node('generate_response',   traced_node('generate_response', nodes.generate_response))
 
     # Wire the graph (the arrows in your flowchart)
     builder.add_edge(START, 'classify_question')
@@ -47,21 +61,23 @@ def build_agent_graph():
     builder.add_conditional_edges('classify_question', route_after_classify,
         {'fast_rag': 'fast_rag', 'plan_steps': 'plan_steps'})
 
-    # Simple path: fast_rag -> generate_response -> END
-    builder.add_edge('fast_rag', 'generate_response')
+    # Simple path: fast_rag -> generate_response -> END,
+    # or fast_rag -> not_found -> END when nothing relevant was retrieved
+    builder.add_conditional_edges('fast_rag', route_after_retrieval,
+        {'generate_response': 'generate_response', 'not_found': 'not_found'})
+    builder.add_edge('not_found', END)
 
     # Complex path: plan_steps -> parallel tools
     builder.add_edge('plan_steps', 'search_docs')
     builder.add_edge('plan_steps', 'check_compliance')
     builder.add_edge('plan_steps', 'check_deadlines')
 
-    # All tools converge back to approval check
-    builder.add_edge('search_docs',      'generate_response')
-    builder.add_edge('check_compliance', 'generate_response')
-    builder.add_edge('check_deadlines',  'generate_response')
+    # All tools converge on the approval check: the gate runs once, after
+    # all three have finished, so nothing reaches generate_response early
+    builder.add_edge(['search_docs', 'check_compliance', 'check_deadlines'], 'approval_gate')
 
     # Conditional fork before generating response
-    builder.add_conditional_edges('check_compliance', route_after_planning,
+    builder.add_conditional_edges('approval_gate', route_after_planning,
         {'human_review': 'human_review', 'generate_response': 'generate_response'})
 
     builder.add_edge('human_review',     'generate_response')
@@ -73,5 +89,11 @@ def build_agent_graph():
     return builder.compile(checkpointer=checkpointer)
 
 
-# Build once at import time — reused by FastAPI endpoints
-agent_graph = build_agent_graph()
+@lru_cache()
+def get_agent_graph():
+    """
+    Build once on first use (or in the startup prewarm) — reused by
+    FastAPI endpoints. Keeps LangGraph and the OpenAI/Qdrant SDKs out of
+    the API's import path.
+    """
+    return build_agent_graph()
@@ -1,24 +1,72 @@
 import logging
-from langchain_openai import ChatOpenAI
+import threading
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langgraph.types import interrupt
 from src.agent.state import AgentState
 from src.agent.tools import (
-    search_audit_documents, check_compliance_gaps,
-    check_remediation_deadlines, generate_executive_summary
+    check_compliance_gaps, check_remediation_deadlines, generate_executive_summary,
+    retrieve_documents, retrieve_summaries, fetch_summary_chunks,
+    format_document_hits, format_summary_hits
 )
 from src.config import get_settings
+from src.services.clients import get_chat_model, get_embeddings
+from src.services.rate_limiter import invoke_llm, embed_query
+from src.services.tracing import span
 
 logger = logging.getLogger(__name__)
-settings = get_settings()
+
+# Summaries are already condensed, so the report prompt can take more of them
+SUMMARY_CONTEXT_CHARS = 3000
+RAW_CONTEXT_CHARS = 500
+
+# Closest sources listed in the templated 'not found' answer
+NEAREST_SOURCES = 3
+
+
+class EarlyExitStats:
+    """Counts simple-path retrieval outcomes so /metrics can report the LLM skip rate."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {'ok': 0, 'no_match': 0, 'failed': 0}
+
+    def record(self, status: str):
+        with self._lock:
+            self.counts[status] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        skipped = counts['no_match'] + counts['failed']
+        return {
+            'simple_path_requests': total,
+            'answered_with_llm': counts['ok'],
+            'skipped_no_match': counts['no_match'],
+            'skipped_retrieval_failed': counts['failed'],
+            'skip_rate': round(skipped / total, 4) if total else 0.0,
+        }
+
+
+early_exit_stats = EarlyExitStats()
+
+
+def call_tool(tool, args: dict) -> str:
+    """Invoke a LangChain tool inside a 'tool' trace span."""
+    with span(f'tool.{tool.name}', kind='tool'):
+        return tool.invoke(args)
+
+
+def traced_search(tool_name: str, retrieve, *args) -> list:
+    """Run a structured retrieval inside the same 'tool' span its search tool gets."""
+    with span(f'tool.{tool_name}', kind='tool') as attrs:
+        hits = retrieve(*args)
+        attrs['hits'] = len(hits)
+        return hits
 
 
 def get_llm():
-    return ChatOpenAI(
-        model=settings.openai_model,
-        temperature=0,
-        openai_api_key=settings.openai_api_key
-    )
+    return get_chat_model(temperature=0)
 
 
 def classify_question(state: AgentState) -> dict:
@@ -35,14 +83,14 @@ def classify_question(state: AgentState) -> dict:
     and identify compliance gaps, then prepare a report')
     User message: {user_message}
     Answer with only one word: simple or complex"""
-    response = llm.invoke([HumanMessage(content=prompt)])
+    response = invoke_llm(llm, [HumanMessage(content=prompt)])
     q_type = response.content.strip().lower()
     if q_type not in ['simple', 'complex']:
         q_type = 'simple'
     logger.info(f'Question classified as: {q_type}')
     return {
         'question_type': q_type,
-        'steps_taken': state.get('steps_taken', []) + [f'Classified as: {q_type}']
+        'steps_taken': [f'Classified as: {q_type}']
     }
 
 
@@ -50,15 +98,70 @@ def fast_rag(state: AgentState) -> dict:
     """
     NODE 2 (simple path): Direct RAG retrieval — same as Phase 3 but faster.
     Skips multi-step planning and goes straight to document search.
+    Only hits scoring at least RELEVANCE_SCORE_THRESHOLD are kept; when
+    none are (or the search fails) the graph answers from not_found
+    without calling the LLM.
     """
     query = state['messages'][-1].content
-    search_result = search_audit_documents.invoke({'query': query, 'top_k': 5})
-    docs = [{'content': search_result, 'source': 'qdrant_search'}]
-    sources = ['audit_documents']
+    threshold = get_settings().relevance_score_threshold
+    try:
+        hits = traced_search('search_audit_documents', retrieve_documents,
+                             query, 5, state.get('jurisdictions'))
+    except Exception as e:
+        logger.warning(f'fast_rag retrieval failed: {e}')
+        early_exit_stats.record('failed')
+        return {
+            'retrieved_docs': [],
+            'sources': [],
+            'retrieval_status': 'failed',
+            'nearest_sources': [],
+            'steps_taken': ['Fast RAG retrieval failed']
+        }
+    relevant = [hit for hit in hits if hit.score >= threshold]
+    if not relevant:
+        nearest = {}
+        for hit in hits:
+            nearest.setdefault(hit.payload.get('source', 'Unknown'), round(hit.score, 3))
+        early_exit_stats.record('no_match')
+        return {
+            'retrieved_docs': [],
+            'sources': [],
+            'retrieval_status': 'no_match',
+            'nearest_sources': [f'{source} (relevance: {score})' for source, score
+                                in list(nearest.items())[:NEAREST_SOURCES]],
+            'steps_taken': [f'Fast RAG retrieval: no hit above relevance {threshold}']
+        }
+    early_exit_stats.record('ok')
+    docs = [{'content': format_document_hits(relevant), 'source': 'qdrant_search'}]
+    sources = list(dict.fromkeys(hit.payload.get('source', 'Unknown') for hit in relevant))
     return {
         'retrieved_docs': docs,
         'sources': sources,
-        'steps_taken': state.get('steps_taken', []) + ['Fast RAG retrieval']
+        'retrieval_status': 'ok',
+        'nearest_sources': [],
+        'steps_taken': ['Fast RAG retrieval']
+    }
+
+
+def not_found(state: AgentState) -> dict:
+    """
+    NODE 2b (simple path, no LLM): templated answer when retrieval found
+    nothing relevant or failed, so out-of-corpus questions return at once.
+    """
+    if state.get('retrieval_status') == 'failed':
+        answer = ('The audit document search is unavailable right now, so I cannot '
+                  'answer this reliably. Please try again shortly.')
+    else:
+        answer = 'I could not find anything in the indexed audit documents that answers this question.'
+        nearest = state.get('nearest_sources', [])
+        if nearest:
+            answer += ('\n\nClosest documents (below the relevance threshold):\n'
+                       + '\n'.join(f'- {source}' for source in nearest))
+        else:
+            answer += '\n\nNo documents are indexed for the searched jurisdictions yet.'
+    return {
+        'final_response': answer,
+        'steps_taken': ['Answered without LLM: no relevant documents']
     }
 
 
@@ -69,17 +172,73 @@ def plan_steps(state: AgentState) -> dict:
     """
     return {
         'needs_approval': True,   # Complex tasks always need approval
-        'steps_taken': state.get('steps_taken', []) + ['Planning multi-step analysis']
+        'steps_taken': ['Planning multi-step analysis']
     }
 
 
 def search_docs(state: AgentState) -> dict:
-    """NODE 4: Run the document search tool."""
+    """
+    NODE 4: Run the document search tools.
+    Starts from the pre-computed summary index. When fewer than
+    SUMMARY_MIN_HITS summaries reach SUMMARY_MIN_SCORE, drills into the raw
+    chunks those summaries were built from (their chunk_ids), ranked against
+    the query; a fresh chunk search is only the fallback when none of those
+    chunks reaches RELEVANCE_SCORE_THRESHOLD.
+    """
+    settings = get_settings()
     query = state['messages'][-1].content
-    result = search_audit_documents.invoke({'query': query, 'top_k': 8})
+    jurisdictions = state.get('jurisdictions')
+    docs, steps = [], []
+    try:
+        # One embedding serves the summary search and any fallback search
+        query_vector = embed_query(get_embeddings(), query)
+    except Exception as e:
+        logger.warning(f'search_docs query embedding failed: {e}')
+        return {'retrieved_docs': docs, 'steps_taken': [f'Query embedding failed: {e}']}
+    try:
+        summaries = traced_search('search_audit_summaries', retrieve_summaries,
+                                  query, 5, jurisdictions, query_vector)
+    except Exception as e:
+        logger.warning(f'search_docs summary search failed: {e}')
+        steps.append(f'Summary search failed: {e}')
+        summaries = []
+    relevant = [hit for hit in summaries if hit.score >= settings.summary_min_score]
+    if relevant:
+        docs.append({'content': format_summary_hits(relevant), 'source': 'summary_index'})
+        steps.append(f'Retrieved {len(relevant)} pre-computed summaries')
+    if len(relevant) >= settings.summary_min_hits:
+        return {'retrieved_docs': docs, 'steps_taken': steps}
+
+    # Not enough summary coverage: drill into the chunks behind the matches
+    chunks = []
+    if relevant:
+        try:
+            chunks = [hit for hit in fetch_summary_chunks(query_vector, relevant)
+                      if hit.score >= settings.relevance_score_threshold]
+        except Exception as e:
+            logger.warning(f'search_docs chunk drill-down failed: {e}')
+            steps.append(f'Chunk drill-down failed: {e}')
+    if chunks:
+        docs.append({'content': format_document_hits(chunks), 'source': 'qdrant'})
+        steps.append(f'Drilled into {len(chunks)} raw chunks behind the matched summaries')
+        return {'retrieved_docs': docs, 'steps_taken': steps}
+
+    try:
+        hits = traced_search('search_audit_documents', retrieve_documents,
+                             query, 8, jurisdictions, query_vector)
+    except Exception as e:
+        # Keep error text out of the report prompt, but not out of the trace
+        logger.warning(f'search_docs document search failed: {e}')
+        steps.append(f'Document search failed: {e}')
+    else:
+        if hits:
+            docs.append({'content': format_document_hits(hits), 'source': 'qdrant'})
+            steps.append('Searched audit documents')
+        else:
+            steps.append('Document search returned no results')
     return {
-        'retrieved_docs': [{'content': result, 'source': 'qdrant'}],
-        'steps_taken': state.get('steps_taken', []) + ['Searched audit documents']
+        'retrieved_docs': docs,
+        'steps_taken': steps
     }
 
 
@@ -89,24 +248,32 @@ def check_compliance(state: AgentState) -> dict:
                               for d in state.get('retrieved_docs', [])])
     if not docs_summary.strip():
         docs_summary = state['messages'][-1].content
-    result = check_compliance_gaps.invoke({'finding_summary': docs_summary})
+    result = call_tool(check_compliance_gaps, {'finding_summary': docs_summary})
     has_gaps = len(result) > 20 and 'no gap' not in result.lower()
     return {
         'compliance_gaps': [result],
         'needs_approval': has_gaps,
-        'steps_taken': state.get('steps_taken', []) + ['Compliance gap check complete']
+        'steps_taken': ['Compliance gap check complete']
     }
 
 
 def check_deadlines(state: AgentState) -> dict:
     """NODE 6: Check upcoming remediation deadlines."""
-    result = check_remediation_deadlines.invoke({'days_threshold': 30})
+    result = call_tool(check_remediation_deadlines, {'days_threshold': 30})
     return {
         'deadline_warnings': [result],
-        'steps_taken': state.get('steps_taken', []) + ['Deadline check complete']
+        'steps_taken': ['Deadline check complete']
     }
 
 
+def approval_gate(state: AgentState) -> dict:
+    """
+    Join point of the parallel complex-path tools. Routing happens on the
+    edge after it (approval or straight to the report); no state changes.
+    """
+    return {}
+
+
 def human_review_node(state: AgentState) -> dict:
     """
     NODE 7: PAUSE and wait for human approval.
@@ -123,12 +290,12 @@ def human_review_node(state: AgentState) -> dict:
     decision = interrupt(message)   # <-- PAUSES HERE
     if decision == 'approved':
         return {
-            'steps_taken': state.get('steps_taken', []) + ['Human approval granted'],
+            'steps_taken': ['Human approval granted'],
             'needs_approval': False
         }
     return {
         'final_response': 'Report generation rejected by reviewer.',
-        'steps_taken': state.get('steps_taken', []) + ['Human approval rejected']
+        'steps_taken': ['Human approval rejected']
     }
 
 
@@ -152,12 +319,17 @@ def generate_response(state: AgentState) -> dict:
         Question: {user_query}
         Context: {context}
         If the answer is not in the context, say so clearly."""
-        response = llm.invoke([HumanMessage(content=prompt)])
+        response = invoke_llm(llm, [HumanMessage(content=prompt)])
         answer = response.content
     else:
-        findings = '\n'.join([d.get('content', '')[:500] for d in docs])
+        findings = '\n'.join([
+            d.get('content', '')[:SUMMARY_CONTEXT_CHARS
+                                 if d.get('source') == 'summary_index'
+                                 else RAW_CONTEXT_CHARS]
+            for d in docs
+        ])
         gaps_text = '\n'.join(gaps) if gaps else 'None identified'
-        answer = generate_executive_summary.invoke({
+        answer = call_tool(generate_executive_summary, {
             'findings': findings,
             'compliance_gaps': gaps_text
         })
@@ -165,5 +337,5 @@ def generate_response(state: AgentState) -> dict:
             answer += '\n\n---\nDEADLINE ALERTS:\n' + '\n'.join(warnings)
     return {
         'final_response': answer,
-        'steps_taken': state.get('steps_taken', []) + ['Response generated']
+        'steps_taken': ['Response generated']
     }
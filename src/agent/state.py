@@ -3,6 +3,17 @@ from langgraph.graph.message import add_messages
 from langchain_core.messages import BaseMessage
 
 
+def add_steps(existing: List[str], new: List[str]) -> List[str]:
+    """
+    Reducer for steps_taken: nodes return only their own new steps, so the
+    parallel complex-path nodes can all report in the same super-step.
+    An empty list (the initial state of each new request) starts over.
+    """
+    if not new:
+        return []
+    return (existing or []) + new
+
+
 class AgentState(TypedDict):
     """
     Shared state that flows through the entire LangGraph.
@@ -20,6 +31,13 @@ class AgentState(TypedDict):
     # Source filenames used
     sources: List[str]
 
+    # Simple-path retrieval outcome: 'ok', 'no_match' (nothing above the
+    # relevance threshold) or 'failed'; the last two skip the LLM
+    retrieval_status: str
+
+    # Closest sources below the threshold, listed in the 'not found' answer
+    nearest_sources: List[str]
+
     # Results from compliance check tool
     compliance_gaps: List[str]
 
@@ -32,8 +50,11 @@ class AgentState(TypedDict):
     # The final response text
     final_response: str
 
-    # Execution trace for the UI
-    steps_taken: List[str]
+    # Execution trace for the UI (Annotated with add_steps = append per node)
+    steps_taken: Annotated[List[str], add_steps]
+
+    # Jurisdiction shards to search (None = detect from the question)
+    jurisdictions: Optional[List[str]]
 
     # Thread config
     thread_id: str
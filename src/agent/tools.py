@@ -1,51 +1,163 @@
 from langchain_core.tools import tool
-from langchain_openai import OpenAIEmbeddings
-from qdrant_client import QdrantClient
-from qdrant_client.models import Filter
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import List, Optional
 from src.config import get_settings
+from src.services.clients import get_embeddings, get_chat_model
+from src.services.rate_limiter import invoke_llm, embed_query
+from src.services.sharding import GENERAL_SHARD, configured_shards, route_query, shard_collection
+from src.services.tracing import span
+from src.services.vector_store import get_vector_store
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
-settings = get_settings()
+
+# Shared by all queries' shard fan-out (threads are only started on demand)
+_shard_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix='shard-search')
+
+
+def _search_collection(collection: str, query_vector: list, top_k: int,
+                       payload_filter: Optional[dict] = None,
+                       ids: Optional[list] = None) -> list:
+    store = get_vector_store()
+    with span(f'{store.name}.search', kind='vector_store', collection=collection,
+              limit=top_k) as attrs:
+        if not store.collection_exists(collection):
+            attrs['hits'] = 0
+            return []
+        results = store.search(collection, query_vector, top_k, payload_filter, ids)
+        attrs['hits'] = len(results)
+        return results
+
+
+def search_shards(query_vector: list, shards: List[str], top_k: int) -> list:
+    """
+    Search each shard's collection in parallel and merge the hits by score.
+    Each shard returns its own top_k, so the merged top_k is exact.
+    """
+    collections = list(dict.fromkeys(shard_collection(s) for s in shards))
+    if len(collections) == 1:
+        return _search_collection(collections[0], query_vector, top_k)
+    # copy_context() keeps each shard's trace span under this tool call
+    futures = [_shard_pool.submit(copy_context().run, _search_collection,
+                                  c, query_vector, top_k) for c in collections]
+    hits = [hit for f in futures for hit in f.result()]
+    return sorted(hits, key=lambda hit: hit.score, reverse=True)[:top_k]
+
+
+def retrieve_documents(query: str, top_k: int = 5,
+                       jurisdictions: Optional[List[str]] = None,
+                       query_vector: Optional[list] = None) -> list:
+    """
+    Structured retrieval behind search_audit_documents: returns the scored
+    hits (best first) so callers can gate on relevance. Raises on failure.
+    Pass query_vector to reuse an embedding of `query` already made.
+    """
+    shards = route_query(query, jurisdictions)
+    if query_vector is None:
+        query_vector = embed_query(get_embeddings(), query)
+    return search_shards(query_vector, shards, top_k)
+
+
+def format_document_hits(hits: list) -> str:
+    output = []
+    for i, hit in enumerate(hits, 1):
+        source = hit.payload.get('source', 'Unknown')
+        content = hit.payload.get('page_content', '')[:800]
+        score = round(hit.score, 3)
+        output.append(f'[{i}] Source: {source} (relevance: {score})')
+        output.append(f'    {content}')
+    return '\n'.join(output)
 
 
 @tool
-def search_audit_documents(query: str, top_k: int = 5) -> str:
+def search_audit_documents(query: str, top_k: int = 5,
+                           jurisdictions: Optional[List[str]] = None) -> str:
     """
     Search the audit document database for findings, policies, or procedures.
     Use this when the user asks about specific audit findings, control gaps,
     remediation status, or any document content.
+    Only the jurisdiction shards relevant to the query are searched
+    (e.g. ['hk', 'sg']); they are detected from the query when not given.
     Returns relevant document excerpts with their source filenames.
     """
     try:
-        client = QdrantClient(host=settings.qdrant_host, port=settings.qdrant_port)
-        embeddings = OpenAIEmbeddings(
-            model=settings.openai_embedding_model,
-            openai_api_key=settings.openai_api_key
-        )
-        query_vector = embeddings.embed_query(query)
-        results = client.search(
-            collection_name=settings.qdrant_collection,
-            query_vector=query_vector,
-            limit=top_k,
-            with_payload=True
-        )
+        results = retrieve_documents(query, top_k, jurisdictions)
         if not results:
             return 'No relevant documents found in the audit database.'
-        output = []
-        for i, hit in enumerate(results, 1):
-            source = hit.payload.get('source', 'Unknown')
-            content = hit.payload.get('page_content', '')[:800]
-            score = round(hit.score, 3)
-            output.append(f'[{i}] Source: {source} (relevance: {score})')
-            output.append(f'    {content}')
-        return '\n'.join(output)
+        return format_document_hits(results)
     except Exception as e:
         logger.error(f'search_audit_documents failed: {e}')
         return f'Document search failed: {str(e)}'
 
 
+def retrieve_summaries(query: str, top_k: int = 5,
+                       jurisdictions: Optional[List[str]] = None,
+                       query_vector: Optional[list] = None) -> list:
+    """
+    Structured retrieval behind search_audit_summaries: scored summary hits
+    (best first), filtered to the routed jurisdictions. Raises on failure.
+    Pass query_vector to reuse an embedding of `query` already made.
+    """
+    settings = get_settings()
+    shards = route_query(query, jurisdictions)
+    payload_filter = None
+    if settings.enable_sharding and set(shards) != set(configured_shards()):
+        payload_filter = {'jurisdiction': shards}
+    if query_vector is None:
+        query_vector = embed_query(get_embeddings(), query)
+    return _search_collection(settings.qdrant_summary_collection,
+                              query_vector, top_k, payload_filter)
+
+
+def format_summary_hits(hits: list) -> str:
+    output = []
+    for i, hit in enumerate(hits, 1):
+        source = hit.payload.get('source', 'Unknown')
+        label = hit.payload.get('finding_id') or 'document summary'
+        score = round(hit.score, 3)
+        output.append(f'[{i}] Source: {source} | {label} (relevance: {score})')
+        output.append(f"    {hit.payload.get('page_content', '')}")
+    return '\n'.join(output)
+
+
+def fetch_summary_chunks(query_vector: list, summary_hits: list, limit: int = 8) -> list:
+    """
+    Drill down: rank the raw chunks the summaries were built from (their
+    chunk_ids) against the query, searching only those chunks in the shards
+    that hold them. Returns the best `limit` chunks with their own scores.
+    """
+    candidates = {}
+    for summary in summary_hits:
+        collection = shard_collection(summary.payload.get('jurisdiction') or GENERAL_SHARD)
+        ids = candidates.setdefault(collection, {})
+        ids.update(dict.fromkeys(summary.payload.get('chunk_ids') or []))
+    hits = [hit for collection, ids in candidates.items() if ids
+            for hit in _search_collection(collection, query_vector, limit, ids=list(ids))]
+    return sorted(hits, key=lambda hit: hit.score, reverse=True)[:limit]
+
+
+@tool
+def search_audit_summaries(query: str, top_k: int = 5,
+                           jurisdictions: Optional[List[str]] = None) -> str:
+    """
+    Search the pre-computed summary index (one summary per document and per
+    finding, built at ingestion time). Use this first for reports and
+    multi-finding analysis; fall back to search_audit_documents for detail.
+    Filtered to the jurisdictions relevant to the query, like the document search.
+    Returns summaries with their source filenames and finding IDs.
+    """
+    try:
+        results = retrieve_summaries(query, top_k, jurisdictions)
+        if not results:
+            return 'No summaries found in the summary index.'
+        return format_summary_hits(results)
+    except Exception as e:
+        logger.warning(f'search_audit_summaries failed: {e}')
+        return f'Summary search failed: {str(e)}'
+
+
 @tool
 def check_compliance_gaps(finding_summary: str) -> str:
     """
@@ -55,8 +167,7 @@ def check_compliance_gaps(finding_summary: str) -> str:
     deadline, missing budget allocation, and overdue status.
     Input: a summary of findings. Returns: identified gaps.
     """
-    from langchain_openai import ChatOpenAI
-    llm = ChatOpenAI(model=settings.openai_model, temperature=0)
+    llm = get_chat_model(temperature=0)
     prompt = f"""You are a compliance officer reviewing audit findings.
     Analyse these findings for regulatory compliance gaps:
     {finding_summary}
@@ -69,7 +180,7 @@ def check_compliance_gaps(finding_summary: str) -> str:
 
     List any missing attributes as GAPS. Reference HKMA or MAS guidelines
     where applicable. Be specific and concise."""
-    response = llm.invoke(prompt)
+    response = invoke_llm(llm, prompt)
     return response.content
 
 
@@ -114,8 +225,7 @@ def generate_executive_summary(findings: str, compliance_gaps: str) -> str:
     analysis is complete and human approval has been granted.
     Returns a formatted executive summary suitable for senior management.
     """
-    from langchain_openai import ChatOpenAI
-    llm = ChatOpenAI(model=settings.openai_model, temperature=0.2)
+    llm = get_chat_model(temperature=0.2)
     prompt = f"""You are a senior internal auditor preparing an executive summary.
     Based on the following findings and compliance analysis, write a concise
     executive summary suitable for the Chief Audit Executive.
@@ -131,13 +241,14 @@ def generate_executive_summary(findings: str, compliance_gaps: str) -> str:
     - Recommended Actions (numbered list, prioritised by risk)
     - Conclusion
     Keep the total under 400 words."""
-    response = llm.invoke(prompt)
+    response = invoke_llm(llm, prompt)
     return response.content
 
 
 # Export all tools as a list for the agent to use
 ALL_TOOLS = [
     search_audit_documents,
+    search_audit_summaries,
     check_compliance_gaps,
     check_remediation_deadlines,
     generate_executive_summary,
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -7,11 +8,41 @@ class Settings(BaseSettings):
     openai_api_key: str
     openai_model: str = 'gpt-4o-mini'
     openai_embedding_model: str = 'text-embedding-3-small'
+    openai_base_url: Optional[str] = None   # e.g. a local stub for load tests
+
+    # OpenAI rate limiting (shared by chat and embedding calls)
+    openai_rpm_limit: int = 500
+    openai_tpm_limit: int = 200000
+    openai_max_concurrency: int = 16
+    openai_latency_target_seconds: float = 10.0
+    openai_max_retries: int = 5
+    embedding_batch_size: int = 64
 
     # Qdrant
-    qdrant_host: str = 'qdrant'
+    qdrant_host: str = 'qdrant'             # ':memory:' = in-process Qdrant (tests)
     qdrant_port: int = 6333
     qdrant_collection: str = 'audit_documents'
+    qdrant_summary_collection: str = 'audit_summaries'
+
+    # Retrieval backend: 'qdrant' (default) or 'embedded' (in-process,
+    # memory-mapped index on local disk; no Qdrant service needed)
+    vector_backend: str = 'qdrant'
+    embedded_index_path: str = './data/embedded_index'
+    embedded_index_dtype: str = 'float32'   # 'int8' = 4x smaller, slightly less exact
+
+    # Jurisdiction shards: one collection per jurisdiction, e.g. audit_documents_hk
+    enable_sharding: bool = True
+    jurisdiction_shards: str = 'hk,sg,fatf'
+
+    # Summary index (pre-computed at ingestion for the complex report path)
+    enable_summary_index: bool = True
+    summary_max_input_chars: int = 12000
+    summary_min_hits: int = 2               # fewer relevant summaries -> drill into raw chunks
+    summary_min_score: float = 0.25         # cosine score a summary needs to count as relevant
+
+    # Simple path: answer with a templated 'not found' (no LLM call) when no
+    # retrieved chunk reaches this cosine relevance score. 0 = always call the LLM.
+    relevance_score_threshold: float = 0.25
 
     # Redis
     redis_url: str = 'redis://redis:6379'
@@ -20,7 +51,23 @@ class Settings(BaseSettings):
     guardrails_url: str = 'http://guardrails:8080'
     use_guardrails: bool = True
 
+    # Admission control for graph executions (/agent/invoke, /agent/stream, /agent/approve).
+    # Keep max_concurrency under the threadpool size (40) that runs invoke/approve.
+    admission_max_concurrency: int = 32
+    admission_max_queue: int = 64
+    admission_queue_timeout_seconds: float = 30.0
+    admission_thread_policy: str = 'queue'   # same thread_id busy: 'queue' or 'reject' (429)
+
+    # SSE streaming (server-side event buffers for resumable streams)
+    stream_buffer_ttl_seconds: int = 900
+    stream_heartbeat_seconds: float = 15.0
+
+    # Per-request span tracing (served by /agent/trace/{thread_id})
+    trace_max_spans_per_thread: int = 500
+    trace_max_threads: int = 1000
+
     # App
+    prewarm_on_startup: bool = True
     app_env: str = 'development'
     log_level: str = 'INFO'
 
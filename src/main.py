@@ -1,91 +1,234 @@
+import asyncio
 import logging
+import math
 import uuid
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Header
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
-from langchain_core.messages import HumanMessage
-from src.agent.graph import agent_graph
+from contextlib import asynccontextmanager
+from functools import partial
 from src.models import AgentRequest, AgentResponse, ApprovalRequest, UploadResponse
+from src.services.admission import AdmissionRejected, get_admission
+from src.services.stream_buffer import StreamRun, get_stream_store, parse_last_event_id
+from src.services.tracing import get_recorder, span, trace_context
 from src.config import get_settings
+from typing import Optional
 import tempfile
+import threading
 import os
-import json
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Filled in by the startup prewarm; reported by /health
+warmup_status = {}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup hook: build the graph, open pooled Qdrant/OpenAI connections
+    and verify the collection before accepting traffic, so the first
+    request does not pay for it.
+    """
+    if settings.prewarm_on_startup:
+        from src.services.clients import prewarm
+        warmup_status.update(await run_in_threadpool(prewarm))
+    yield
+
+
 app = FastAPI(
     title='Agentic RAG Assistant API',
     description='LangGraph-powered audit agent with NeMo Guardrails',
-    version='1.0.0'
+    version='1.0.0',
+    lifespan=lifespan
 )
 
 
-@app.get('/health')
-def health():
-    return {'status': 'ok', 'agent': 'ready'}
+def get_agent_graph():
+    """Import and build the graph on first use (see src.agent.graph)."""
+    from src.agent.graph import get_agent_graph as build
+    return build()
 
 
-@app.post('/agent/invoke', response_model=AgentResponse)
-async def invoke_agent(request: AgentRequest):
-    """
-    Send a message to the agent and wait for the complete response.
-    Use this for simple queries. For streaming, use /agent/stream.
-    """
-    thread_id = request.thread_id or str(uuid.uuid4())
-    config = {'configurable': {'thread_id': thread_id}}
-    initial_state = {
+def initial_agent_state(request: AgentRequest, thread_id: str) -> dict:
+    from langchain_core.messages import HumanMessage
+    from src.services.sharding import validate_shards
+    jurisdictions = request.jurisdictions
+    if jurisdictions:
+        try:
+            jurisdictions = validate_shards(jurisdictions)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return {
         'messages': [HumanMessage(content=request.message)],
         'question_type': '',
         'retrieved_docs': [],
         'sources': [],
+        'retrieval_status': '',
+        'nearest_sources': [],
         'compliance_gaps': [],
         'deadline_warnings': [],
         'needs_approval': False,
         'final_response': '',
         'steps_taken': [],
+        'jurisdictions': jurisdictions,
         'thread_id': thread_id,
     }
+
+
+def admission_error(e: AdmissionRejected) -> HTTPException:
+    """Turn a shed request into a 429/503 with a Retry-After hint."""
+    headers = {'Retry-After': str(math.ceil(e.retry_after))} if e.retry_after else None
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers=headers)
+
+
+def _traced_invoke(thread_id: str, span_name: str, attrs: dict, *args, **kwargs) -> dict:
+    """Run the graph synchronously inside a request span (called in the threadpool)."""
+    with trace_context(thread_id), span(span_name, kind='request', **attrs):
+        return get_agent_graph().invoke(*args, **kwargs)
+
+
+@app.get('/health')
+def health():
+    return {'status': 'ok', 'agent': 'ready', 'warmup': warmup_status}
+
+
+@app.get('/metrics')
+async def metrics():
+    """
+    Load metrics: admission queue depth, active executions and rejections,
+    the OpenAI scheduler's in-flight calls and rate-limit counters, and how
+    often the simple path skipped the LLM (relevance-gated early exit).
+    """
+    from src.agent.nodes import early_exit_stats
+    from src.services.rate_limiter import get_scheduler
+    return {'admission': get_admission().stats(), 'openai': get_scheduler().stats(),
+            'early_exit': early_exit_stats.stats()}
+
+
+@app.post('/agent/invoke', response_model=AgentResponse)
+async def invoke_agent(request: AgentRequest):
+    """
+    Send a message to the agent and wait for the complete response.
+    Use this for simple queries. For streaming, use /agent/stream.
+    """
+    thread_id = request.thread_id or str(uuid.uuid4())
+    config = {'configurable': {'thread_id': thread_id}}
+    initial_state = initial_agent_state(request, thread_id)
     try:
-        result = agent_graph.invoke(initial_state, config)
+        async with get_admission().slot(thread_id):
+            # The graph is synchronous: run it off the event loop
+            result = await run_in_threadpool(_traced_invoke, thread_id, 'agent.invoke', {},
+                                             initial_state, config)
+        paused = result.get('__interrupt__')
         return AgentResponse(
-            response=result.get('final_response', 'No response generated'),
+            # While paused, show the reviewer prompt from interrupt()
+            response=paused[0].value if paused
+            else result.get('final_response') or 'No response generated',
             thread_id=thread_id,
             steps_taken=result.get('steps_taken', []),
             sources=result.get('sources', []),
-            requires_human_approval=result.get('needs_approval', False),
+            requires_human_approval=bool(paused) or result.get('needs_approval', False),
+            pending_action='human_review' if paused else None,
         )
+    except AdmissionRejected as e:
+        raise admission_error(e)
     except Exception as e:
         logger.error(f'Agent invocation failed: {e}')
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _run_stream(run: StreamRun, initial_state: dict, config: dict, on_done):
+    """
+    Execute the graph in the background and buffer every update.
+    Runs independently of the HTTP connection, so a dropped client does
+    not cancel (or later repeat) the LLM calls. `on_done` releases the
+    admission slot once the execution (not the connection) ends.
+    """
+    try:
+        with trace_context(run.thread_id), span('agent.stream', kind='request'):
+            for chunk in get_agent_graph().stream(initial_state, config, stream_mode='updates'):
+                for node_name, node_output in chunk.items():
+                    # '__interrupt__' updates carry a tuple, not a state dict
+                    paused = node_name == '__interrupt__'
+                    node_output = node_output if isinstance(node_output, dict) else {}
+                    run.append({
+                        'node': node_name,
+                        'steps': node_output.get('steps_taken', []),
+                        'response': node_output.get('final_response', ''),
+                        'needs_approval': paused or node_output.get('needs_approval', False)
+                    })
+    except Exception as e:
+        logger.error(f'Agent stream {run.run_id} failed: {e}')
+        run.append({'node': 'error', 'steps': [], 'response': '',
+                    'needs_approval': False, 'error': str(e)})
+    finally:
+        run.finish()
+        on_done()
+
+
 @app.post('/agent/stream')
-async def stream_agent(request: AgentRequest):
+async def stream_agent(request: AgentRequest,
+                       last_event_id: Optional[str] = Header(None)):
     """
     Stream the agent's intermediate steps in real time.
     Returns Server-Sent Events (SSE). The Streamlit frontend listens to these.
+    Every event carries an ID; reconnecting with a Last-Event-ID header
+    replays the missed events and follows the still-running execution
+    instead of starting the graph again.
     """
+    store = get_stream_store()
     thread_id = request.thread_id or str(uuid.uuid4())
-    config = {'configurable': {'thread_id': thread_id}}
-    initial_state = {
-        'messages': [HumanMessage(content=request.message)],
-        'question_type': '', 'retrieved_docs': [], 'sources': [],
-        'compliance_gaps': [], 'deadline_warnings': [],
-        'needs_approval': False, 'final_response': '',
-        'steps_taken': [], 'thread_id': thread_id,
-    }
+    run, replay_from = None, 0
+    if last_event_id:
+        try:
+            run_id, replay_from = parse_last_event_id(last_event_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        run = store.get(run_id)
+        if run is None:
+            raise HTTPException(status_code=410,
+                                detail='Stream expired. Please resend the message.')
+    if run is None:
+        # A plain retry of the same message while it is still running
+        # attaches to that run and replays it from the start.
+        active = store.active_for_thread(thread_id)
+        if active is not None and active.message == request.message:
+            run = active
+    if run is None:
+        config = {'configurable': {'thread_id': thread_id}}
+        initial_state = initial_agent_state(request, thread_id)
+        admission = get_admission()
+        try:
+            await admission.acquire(thread_id)
+        except AdmissionRejected as e:
+            raise admission_error(e)
+        loop = asyncio.get_running_loop()
+        release = partial(loop.call_soon_threadsafe, admission.release, thread_id)
+        try:
+            run = store.create(thread_id, request.message)
+            threading.Thread(target=_run_stream, args=(run, initial_state, config, release),
+                             daemon=True).start()
+        except Exception:
+            admission.release(thread_id)
+            raise
 
-    def event_generator():
-        for chunk in agent_graph.stream(initial_state, config, stream_mode='updates'):
-            for node_name, node_output in chunk.items():
-                event = {
-                    'node': node_name,
-                    'steps': node_output.get('steps_taken', []),
-                    'response': node_output.get('final_response', ''),
-                    'needs_approval': node_output.get('needs_approval', False)
-                }
-                yield f'data: {json.dumps(event)}\n\n'
+    async def event_generator():
+        # Async, so an idle stream waits on the event loop rather than
+        # holding one of the threadpool workers that invoke/approve need
+        seq = replay_from
+        while True:
+            events, done = await run.wait_for_async(
+                seq, timeout=settings.stream_heartbeat_seconds)
+            for data in events:
+                seq += 1
+                yield f'id: {run.event_id(seq)}\ndata: {data}\n\n'
+            if done and not events:
+                break
+            if not events:
+                yield ': keep-alive\n\n'   # SSE comment, keeps idle connections open
 
     return StreamingResponse(event_generator(), media_type='text/event-stream')
 
@@ -96,28 +239,57 @@ async def approve_action(request: ApprovalRequest):
     Submit human approval/rejection for a paused agent workflow.
     The agent resumes from where it paused (human_review node).
     """
+    from langgraph.types import Command
     config = {'configurable': {'thread_id': request.thread_id}}
     try:
-        result = agent_graph.invoke(
-            None,        # None = resume from checkpoint
-            config,
-            command={'resume': request.decision}
-        )
+        async with get_admission().slot(request.thread_id):
+            snapshot = await run_in_threadpool(get_agent_graph().get_state, config)
+            if not snapshot.interrupts:
+                raise HTTPException(status_code=409,
+                                    detail='Thread is not waiting for approval.')
+            result = await run_in_threadpool(
+                _traced_invoke, request.thread_id, 'agent.approve',
+                {'decision': request.decision},
+                # Resume from the checkpoint, handing the decision to interrupt()
+                Command(resume=request.decision),
+                config
+            )
         return {
             'status': 'resumed',
             'decision': request.decision,
             'response': result.get('final_response', ''),
+            'steps_taken': result.get('steps_taken', []),
             'reviewer': request.reviewer_name
         }
+    except AdmissionRejected as e:
+        raise admission_error(e)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get('/agent/trace/{thread_id}')
+def get_trace(thread_id: str):
+    """
+    Timed spans (graph nodes, tool calls, LLM calls, Qdrant operations)
+    recorded for a conversation, oldest first. Spans sharing a trace_id
+    belong to the same request; parent_id links form the call tree.
+    """
+    return {'thread_id': thread_id, 'spans': get_recorder().get(thread_id)}
+
+
 @app.post('/documents/upload', response_model=UploadResponse)
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(file: UploadFile = File(...),
+                          summarize: Optional[bool] = Form(None),
+                          jurisdiction: Optional[str] = Form(None)):
     """
     Upload a PDF and index it into Qdrant.
     Reused from Phase 3 — same indexing pipeline.
+    Set summarize=false to skip building the summary index for this file
+    (defaults to the ENABLE_SUMMARY_INDEX setting).
+    Set jurisdiction (e.g. 'hk') to choose the shard instead of detecting
+    it from the document text.
     """
     from src.services.rag_service import index_document
     if not file.filename.endswith('.pdf'):
@@ -127,11 +299,14 @@ async def upload_document(file: UploadFile = File(...)):
         tmp.write(content)
         tmp_path = tmp.name
     try:
-        chunks = await index_document(tmp_path, file.filename)
-        return UploadResponse(
-            filename=file.filename,
-            chunks_indexed=chunks,
-            status='indexed'
-        )
+        chunks = await index_document(tmp_path, file.filename, summarize=summarize,
+                                      jurisdiction=jurisdiction)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     finally:
         os.unlink(tmp_path)
+    return UploadResponse(
+        filename=file.filename,
+        chunks_indexed=chunks,
+        status='indexed'
+    )
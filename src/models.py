@@ -4,8 +4,9 @@ from typing import Optional, List
 
 class AgentRequest(BaseModel):
     message: str
-    thread_id: str = 'default'          # Each thread = one conversation
+    thread_id: Optional[str] = None     # Each thread = one conversation; None = new uuid
     require_approval: bool = True        # Enable human-in-the-loop
+    jurisdictions: Optional[List[str]] = None   # e.g. ['hk']; detected from the message if omitted
 
 
 class AgentResponse(BaseModel):
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Callable, Deque, Dict, Optional
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of queued; maps to an HTTP error."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Admission control for graph executions:
+    - at most `max_concurrency` executions run at once (global slots)
+    - at most `max_queue` requests wait, FIFO; any more are rejected with 503
+      straight away, and a waiter gives up with 503 after `queue_timeout`
+    - one execution per thread_id at a time, so two requests never race on
+      the same checkpoint; a second request for a busy thread either waits
+      its turn ('queue') or gets 429 ('reject')
+    Slots are handed directly to the next waiter on release, so a queued
+    request cannot be overtaken by a newcomer.
+    Must be used from one event loop; release from other threads with
+    loop.call_soon_threadsafe.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float,
+                 thread_policy: str = 'queue'):
+        if thread_policy not in ('queue', 'reject'):
+            raise ValueError(f"thread_policy must be 'queue' or 'reject', got {thread_policy!r}")
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.thread_policy = thread_policy
+        self.active = 0
+        self.queued = 0
+        self._slot_waiters: Deque[asyncio.Future] = deque()
+        # thread_id -> waiters for that thread; present while the thread is busy
+        self._busy_threads: Dict[str, Deque[asyncio.Future]] = {}
+        self.admitted = 0
+        self.rejected = {'queue_full': 0, 'queue_timeout': 0, 'thread_busy': 0}
+        self._queue_waits: Deque[float] = deque(maxlen=1000)
+
+    async def _wait(self, waiters: Deque[asyncio.Future], what: str,
+                    give_back: Callable[[], None]):
+        """Queue for a handoff; on any failure, return whatever was granted."""
+        if self.queued >= self.max_queue:
+            self.rejected['queue_full'] += 1
+            raise AdmissionRejected(503, 'Server busy: request queue is full. Please retry.',
+                                    retry_after=self.queue_timeout)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiters.append(future)
+        self.queued += 1
+        started = loop.time()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            # On Python 3.12+ a handoff racing the timeout still raises
+            # TimeoutError; the slot is ours then, so keep it (not leak it)
+            if not (future.done() and not future.cancelled()):
+                self.rejected['queue_timeout'] += 1
+                raise AdmissionRejected(503, f'Server busy: timed out waiting for {what}. '
+                                             'Please retry.', retry_after=self.queue_timeout)
+        except BaseException:
+            # Cancelled (e.g. client disconnect) just after being granted
+            if future.done() and not future.cancelled():
+                give_back()
+            raise
+        finally:
+            self.queued -= 1
+            if future in waiters:
+                waiters.remove(future)
+            self._queue_waits.append(loop.time() - started)
+
+    def _handoff(self, waiters: Deque[asyncio.Future]) -> bool:
+        """Pass a freed slot or thread to the oldest live waiter, if any."""
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return True
+        return False
+
+    async def acquire(self, thread_id: str):
+        # Per-thread exclusion first, so a queued follow-up does not hold a global slot
+        if thread_id in self._busy_threads:
+            if self.thread_policy == 'reject':
+                self.rejected['thread_busy'] += 1
+                raise AdmissionRejected(
+                    429, f'Thread {thread_id} is already processing a request. '
+                         'Wait for it to finish.', retry_after=1)
+            await self._wait(self._busy_threads[thread_id], f'thread {thread_id}',
+                             lambda: self._release_thread(thread_id))
+        else:
+            self._busy_threads[thread_id] = deque()
+        try:
+            if self.active < self.max_concurrency and not self._slot_waiters:
+                self.active += 1
+            else:
+                await self._wait(self._slot_waiters, 'a free slot', self._release_slot)
+        except BaseException:
+            self._release_thread(thread_id)
+            raise
+        self.admitted += 1
+
+    def _release_slot(self):
+        if not self._handoff(self._slot_waiters):
+            self.active -= 1
+
+    def _release_thread(self, thread_id: str):
+        waiters = self._busy_threads.get(thread_id)
+        if waiters is not None and not self._handoff(waiters):
+            del self._busy_threads[thread_id]
+
+    def release(self, thread_id: str):
+        self._release_slot()
+        self._release_thread(thread_id)
+
+    @asynccontextmanager
+    async def slot(self, thread_id: str):
+        await self.acquire(thread_id)
+        try:
+            yield
+        finally:
+            self.release(thread_id)
+
+    def stats(self) -> dict:
+        waits = sorted(self._queue_waits)
+
+        def pct(p):
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1) if waits else 0.0
+        return {
+            'active': self.active,
+            'max_concurrency': self.max_concurrency,
+            'queued': self.queued,
+            'max_queue': self.max_queue,
+            'busy_threads': len(self._busy_threads),
+            'admitted': self.admitted,
+            'rejected': dict(self.rejected),
+            'queue_wait_ms': {'p50': pct(0.5), 'p95': pct(0.95)},
+        }
+
+
+@lru_cache()
+def get_admission() -> AdmissionController:
+    settings = get_settings()
+    return AdmissionController(
+        max_concurrency=settings.admission_max_concurrency,
+        max_queue=settings.admission_max_queue,
+        queue_timeout=settings.admission_queue_timeout_seconds,
+        thread_policy=settings.admission_thread_policy,
+    )
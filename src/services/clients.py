@@ -0,0 +1,92 @@
+# Shared, lazily-created clients for OpenAI and Qdrant.
+# Heavy SDKs are imported on first use rather than at module import, and
+# each client is built once per process so its HTTP connection pool is
+# reused across requests instead of being set up on every tool call.
+import logging
+from functools import lru_cache
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache()
+def get_qdrant_client():
+    from qdrant_client import QdrantClient
+    settings = get_settings()
+    if settings.qdrant_host == ':memory:':
+        return QdrantClient(location=':memory:')
+    return QdrantClient(host=settings.qdrant_host, port=settings.qdrant_port)
+
+
+@lru_cache()
+def get_embeddings():
+    from langchain_openai import OpenAIEmbeddings
+    settings = get_settings()
+    return OpenAIEmbeddings(
+        model=settings.openai_embedding_model,
+        openai_api_key=settings.openai_api_key,
+        base_url=settings.openai_base_url,
+        # OpenAI-compatible servers expect raw text, not tiktoken token IDs
+        check_embedding_ctx_length=settings.openai_base_url is None,
+        max_retries=0      # retries are owned by the rate limiter
+    )
+
+
+@lru_cache()
+def get_chat_model(temperature: float = 0):
+    from langchain_openai import ChatOpenAI
+    settings = get_settings()
+    return ChatOpenAI(
+        model=settings.openai_model,
+        temperature=temperature,
+        openai_api_key=settings.openai_api_key,
+        base_url=settings.openai_base_url,
+        max_retries=0      # retries are owned by the rate limiter
+    )
+
+
+def ensure_collection(client, collection_name: str, size: int = 1536):
+    """Create the Qdrant collection if it does not exist yet."""
+    from qdrant_client.models import Distance, VectorParams
+    try:
+        client.get_collection(collection_name)
+    except Exception:
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(size=size, distance=Distance.COSINE)
+        )
+
+
+def prewarm() -> dict:
+    """
+    Build the agent graph and open pooled connections before the first
+    request. Each step is independent and failures are only logged: the
+    API still starts and the step is retried lazily on first use.
+    """
+    settings = get_settings()
+    status = {}
+    try:
+        from src.agent.graph import get_agent_graph
+        get_agent_graph()
+        status['graph'] = 'ready'
+    except Exception as e:
+        logger.warning(f'Prewarm: agent graph build failed: {e}')
+        status['graph'] = f'error: {e}'
+    try:
+        from src.services.vector_store import get_vector_store
+        store = get_vector_store()
+        store.ensure_collection(settings.qdrant_collection)
+        status['vector_store'] = f'ready ({store.name})'
+    except Exception as e:
+        logger.warning(f'Prewarm: vector store collection check failed: {e}')
+        status['vector_store'] = f'error ({settings.vector_backend}): {e}'
+    try:
+        get_embeddings()
+        # Listing models costs no tokens and opens the shared HTTPS pool
+        get_chat_model().root_client.models.list()
+        status['openai'] = 'ready'
+    except Exception as e:
+        logger.warning(f'Prewarm: OpenAI connection failed: {e}')
+        status['openai'] = f'error: {e}'
+    logger.info(f'Prewarm complete: {status}')
+    return status
@@ -1,41 +1,158 @@
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
 from src.config import get_settings
+from src.services.clients import get_embeddings, get_chat_model
+from src.services.vector_store import get_vector_store
+from src.services.sharding import (
+    detect_document_jurisdiction, shard_collection, validate_shards
+)
+from src.services.rate_limiter import (
+    invoke_llm, embed_documents, PRIORITY_BATCH, PRIORITY_INGESTION
+)
+from typing import Optional
+import asyncio
+import logging
+import re
 import uuid
 
+logger = logging.getLogger(__name__)
 
-async def index_document(file_path: str, filename: str) -> int:
+# Finding IDs look like HK-2024-001 / SG-2024-011 in our audit reports
+FINDING_ID_PATTERN = re.compile(r'\b([A-Z]{2}-\d{4}-\d{3})\b')
+
+
+def finding_spans(text: str) -> dict:
+    """
+    Map each finding ID to the (start, end) span of its segment in `text`.
+    A segment runs from the first mention of a finding ID to the first
+    mention of the next one, so cross-references further down the
+    document do not pull text into the wrong finding.
+    """
+    first_seen = {}
+    for match in FINDING_ID_PATTERN.finditer(text):
+        first_seen.setdefault(match.group(1), match.start())
+    ordered = sorted(first_seen.items(), key=lambda item: item[1])
+    return {finding_id: (start, ordered[i + 1][1] if i + 1 < len(ordered) else len(text))
+            for i, (finding_id, start) in enumerate(ordered)}
+
+
+def split_findings(text: str) -> dict:
+    """Split a document's text into one segment per finding ID."""
+    return {finding_id: text[start:end].strip()
+            for finding_id, (start, end) in finding_spans(text).items()}
+
+
+def _summarise(llm, text: str, focus: str) -> str:
+    prompt = f"""You are an internal auditor building a summary index.
+    Summarise the following {focus} in at most 120 words.
+    Keep finding IDs, severities, owners, target dates, status, budgets
+    and regulatory references (HKMA, MAS, FATF) exactly as written.
+
+    TEXT:\n{text}"""
+    return invoke_llm(llm, prompt, priority=PRIORITY_BATCH).content.strip()
+
+
+def index_summaries(store, embeddings, filename: str, chunks: list,
+                    chunk_ids: list) -> int:
+    """
+    Ingestion-time summary index.
+    Pre-computes one summary per document and one per finding and stores
+    them in a separate collection, so the complex report path can start
+    from compact, pre-summarised material instead of raw chunks.
+    """
     settings = get_settings()
+    llm = get_chat_model(temperature=0)
+    full_text = '\n'.join(chunk.page_content for chunk in chunks)
+    max_chars = settings.summary_max_input_chars
+    # Where each chunk sits in full_text, to map finding segments to chunks
+    chunk_spans, offset = [], 0
+    for chunk in chunks:
+        chunk_spans.append((offset, offset + len(chunk.page_content)))
+        offset += len(chunk.page_content) + 1
+
+    entries = [{
+        'summary_type': 'document',
+        'finding_id': None,
+        'text': _summarise(llm, full_text[:max_chars], 'audit document'),
+        'chunk_ids': chunk_ids,
+    }]
+    for finding_id, (start, end) in finding_spans(full_text).items():
+        segment = full_text[start:end].strip()
+        entries.append({
+            'summary_type': 'finding',
+            'finding_id': finding_id,
+            'text': _summarise(llm, segment[:max_chars], f'audit finding {finding_id}'),
+            # Raw chunks to drill into when the summary is not enough: the
+            # ones overlapping the finding's segment, not every chunk that
+            # merely mentions its ID
+            'chunk_ids': [cid for (chunk_start, chunk_end), cid in zip(chunk_spans, chunk_ids)
+                          if chunk_start < end and chunk_end > start],
+        })
+
+    vectors = embed_documents(embeddings, [e['text'] for e in entries],
+                              priority=PRIORITY_BATCH)
+    payloads = [{
+        'page_content': entry['text'],
+        'source': filename,
+        'summary_type': entry['summary_type'],
+        'finding_id': entry['finding_id'],
+        'chunk_ids': entry['chunk_ids'],
+        'jurisdiction': chunks[0].metadata.get('jurisdiction'),
+    } for entry in entries]
+    store.ensure_collection(settings.qdrant_summary_collection)
+    store.upsert(settings.qdrant_summary_collection,
+                 [str(uuid.uuid4()) for _ in entries], vectors, payloads)
+    logger.info(f'Indexed {len(entries)} summaries for {filename}')
+    return len(entries)
+
+
+def _index_document_sync(file_path: str, filename: str, summarize: bool,
+                         jurisdiction: Optional[str]) -> int:
     loader = PyPDFLoader(file_path)
     docs = loader.load()
+    if jurisdiction is None:
+        jurisdiction = detect_document_jurisdiction(
+            '\n'.join(d.page_content for d in docs), filename)
+    collection = shard_collection(jurisdiction)
     splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100)
     chunks = splitter.split_documents(docs)
     for chunk in chunks:
         chunk.metadata['source'] = filename
-    embeddings = OpenAIEmbeddings(
-        model=settings.openai_embedding_model,
-        openai_api_key=settings.openai_api_key
-    )
-    client = QdrantClient(host=settings.qdrant_host, port=settings.qdrant_port)
-    # Ensure collection exists
-    try:
-        client.get_collection(settings.qdrant_collection)
-    except Exception:
-        client.create_collection(
-            collection_name=settings.qdrant_collection,
-            vectors_config=VectorParams(size=1536, distance=Distance.COSINE)
-        )
-    points = []
-    for chunk in chunks:
-        vector = embeddings.embed_query(chunk.page_content)
-        points.append(PointStruct(
-            id=str(uuid.uuid4()),
-            vector=vector,
-            payload={'page_content': chunk.page_content, **chunk.metadata}
-        ))
-    if points:
-        client.upsert(collection_name=settings.qdrant_collection, points=points)
-    return len(points)
+        chunk.metadata['jurisdiction'] = jurisdiction
+    embeddings = get_embeddings()
+    store = get_vector_store()
+    store.ensure_collection(collection)
+    # Lowest priority: live chat traffic gets the quota first
+    vectors = embed_documents(embeddings, [c.page_content for c in chunks],
+                              priority=PRIORITY_INGESTION)
+    ids = [str(uuid.uuid4()) for _ in chunks]
+    if ids:
+        # Appended incrementally: existing points are never rewritten
+        store.upsert(collection, ids, vectors,
+                     [{'page_content': c.page_content, **c.metadata} for c in chunks])
+        logger.info(f'Indexed {len(ids)} chunks of {filename} into {collection}')
+        if summarize:
+            # A failed summary pass must not fail the upload: the raw
+            # chunks are indexed and the complex path falls back to them.
+            try:
+                index_summaries(store, embeddings, filename, chunks, ids)
+            except Exception as e:
+                logger.warning(f'Summary indexing failed for {filename}: {e}')
+    return len(ids)
+
+
+async def index_document(file_path: str, filename: str,
+                         summarize: Optional[bool] = None,
+                         jurisdiction: Optional[str] = None) -> int:
+    """
+    Index a PDF into its jurisdiction shard. `jurisdiction` (e.g. 'hk')
+    overrides detection from the document text; raises ValueError if it
+    is not a configured shard.
+    """
+    if summarize is None:
+        summarize = get_settings().enable_summary_index
+    if jurisdiction is not None:
+        jurisdiction = validate_shards([jurisdiction])[0]
+    # Indexing blocks on the rate limiter and OpenAI; keep it off the event loop
+    return await asyncio.to_thread(_index_document_sync, file_path, filename,
+                                   summarize, jurisdiction)
@@ -0,0 +1,263 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, List, Optional
+from src.config import get_settings
+from src.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Priority classes: lower number = served first when the quota is tight
+PRIORITY_INTERACTIVE = 0     # live chat: graph LLM calls, query embeddings
+PRIORITY_BATCH = 1           # background LLM work, e.g. ingestion summaries
+PRIORITY_INGESTION = 2       # bulk chunk embedding during uploads
+
+# Rough output allowance reserved from the TPM bucket for each chat call
+COMPLETION_TOKEN_ESTIMATE = 500
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `per_minute` / 60 per second."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        # May go negative when correcting an under-estimate; the deficit
+        # simply delays the next callers.
+        self.tokens -= min(amount, self.capacity)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return getattr(error, 'status_code', None) == 429 or \
+        type(error).__name__ == 'RateLimitError'
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """429s, 5xx responses, timeouts and dropped connections are worth retrying."""
+    if is_rate_limit_error(error):
+        return True
+    status = getattr(error, 'status_code', None)
+    if isinstance(status, int) and status >= 500:
+        return True
+    return type(error).__name__ in ('APITimeoutError', 'APIConnectionError',
+                                    'InternalServerError')
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class OpenAIScheduler:
+    """
+    Central gate for every OpenAI call in the process.
+    - Two token buckets enforce requests-per-minute and tokens-per-minute.
+    - Waiting calls are served strictly by priority, then arrival order.
+    - Concurrency adapts (AIMD): halved on a 429, reduced when latency
+      exceeds the target, and grown back slowly while calls are healthy.
+    - Retryable failures are retried with full-jitter exponential backoff.
+    """
+
+    def __init__(self, rpm: int, tpm: int, max_concurrency: int,
+                 latency_target_seconds: float, max_retries: int,
+                 backoff_base_seconds: float = 0.5, backoff_max_seconds: float = 30.0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = float(max_concurrency)
+        self.latency_target_seconds = latency_target_seconds
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.in_flight = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self._waiting = []                 # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _acquire(self, priority: int, tokens: int):
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    wait = 1.0
+                    if self._waiting[0] == ticket and \
+                            self.in_flight < max(1, int(self.concurrency_limit)):
+                        now = time.monotonic()
+                        wait = max(self.requests.wait_time(1, now),
+                                   self.tokens.wait_time(tokens, now))
+                        if wait <= 0:
+                            heapq.heappop(self._waiting)
+                            self.requests.consume(1)
+                            self.tokens.consume(tokens)
+                            self.in_flight += 1
+                            self._cond.notify_all()
+                            return
+                    self._cond.wait(wait)
+            except BaseException:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+
+    def _release(self, latency: Optional[float], rate_limited: bool = False,
+                 token_correction: int = 0):
+        with self._cond:
+            self.in_flight -= 1
+            if token_correction:
+                self.tokens.consume(token_correction)
+            if rate_limited:
+                self.rate_limited += 1
+                self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+                logger.warning(f'OpenAI 429: concurrency limit -> {self.concurrency_limit:.1f}')
+            elif latency is not None:
+                if latency > self.latency_target_seconds:
+                    self.concurrency_limit = max(1.0, self.concurrency_limit * 0.9)
+                else:
+                    self.concurrency_limit = min(
+                        float(self.max_concurrency),
+                        self.concurrency_limit + 1.0 / self.concurrency_limit)
+            self._cond.notify_all()
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max_seconds)
+        ceiling = min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt)
+        return random.uniform(0, ceiling)
+
+    def call(self, fn: Callable, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0,
+             usage: Optional[Callable] = None):
+        """
+        Run `fn()` once the quota allows it, retrying retryable failures.
+        `tokens` is the estimated TPM cost; `usage(result)` may return the
+        actual token count so the bucket can be corrected afterwards.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._acquire(priority, tokens)
+            started = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                self._release(None, rate_limited=is_rate_limit_error(e))
+                if attempt == self.max_retries or not is_retryable_error(e):
+                    raise
+                delay = self._backoff(attempt, e)
+                self.retries += 1
+                logger.info(f'OpenAI call failed ({type(e).__name__}); '
+                            f'retry {attempt + 1}/{self.max_retries} in {delay:.2f}s')
+                time.sleep(delay)
+                continue
+            actual = usage(result) if usage else None
+            correction = actual - tokens if isinstance(actual, int) else 0
+            self._release(time.monotonic() - started, token_correction=correction)
+            return result
+
+    def stats(self) -> dict:
+        with self._cond:
+            queued = {}
+            for priority, _ in self._waiting:
+                queued[priority] = queued.get(priority, 0) + 1
+            return {
+                'in_flight': self.in_flight,
+                'queued': {'interactive': queued.get(PRIORITY_INTERACTIVE, 0),
+                           'batch': queued.get(PRIORITY_BATCH, 0),
+                           'ingestion': queued.get(PRIORITY_INGESTION, 0)},
+                'concurrency_limit': round(self.concurrency_limit, 2),
+                'rate_limited': self.rate_limited,
+                'retries': self.retries,
+            }
+
+
+@lru_cache()
+def get_scheduler() -> OpenAIScheduler:
+    settings = get_settings()
+    return OpenAIScheduler(
+        rpm=settings.openai_rpm_limit,
+        tpm=settings.openai_tpm_limit,
+        max_concurrency=settings.openai_max_concurrency,
+        latency_target_seconds=settings.openai_latency_target_seconds,
+        max_retries=settings.openai_max_retries,
+    )
+
+
+def estimate_tokens(prompt) -> int:
+    """~4 characters per token; good enough for budgeting the TPM bucket."""
+    if isinstance(prompt, str):
+        return len(prompt) // 4 + 1
+    return sum(len(str(getattr(m, 'content', m))) for m in prompt) // 4 + 1
+
+
+def _total_tokens(response) -> Optional[int]:
+    usage = getattr(response, 'usage_metadata', None)
+    total = usage.get('total_tokens') if isinstance(usage, dict) else None
+    return total if isinstance(total, int) else None
+
+
+def invoke_llm(llm, prompt, priority: int = PRIORITY_INTERACTIVE):
+    """Rate-limited `llm.invoke(prompt)`, recorded as an 'llm' trace span."""
+    with span('llm.chat', kind='llm', model=getattr(llm, 'model_name', None)) as attrs:
+        response = get_scheduler().call(
+            lambda: llm.invoke(prompt),
+            priority=priority,
+            tokens=estimate_tokens(prompt) + COMPLETION_TOKEN_ESTIMATE,
+            usage=_total_tokens,
+        )
+        usage = getattr(response, 'usage_metadata', None)
+        if isinstance(usage, dict):
+            attrs['input_tokens'] = usage.get('input_tokens')
+            attrs['output_tokens'] = usage.get('output_tokens')
+        return response
+
+
+def embed_query(embeddings, text: str, priority: int = PRIORITY_INTERACTIVE) -> List[float]:
+    """Rate-limited `embeddings.embed_query(text)`."""
+    tokens = estimate_tokens(text)
+    with span('llm.embed_query', kind='llm', estimated_tokens=tokens):
+        return get_scheduler().call(lambda: embeddings.embed_query(text),
+                                    priority=priority, tokens=tokens)
+
+
+def embed_documents(embeddings, texts: List[str],
+                    priority: int = PRIORITY_INGESTION) -> List[List[float]]:
+    """
+    Rate-limited `embeddings.embed_documents(texts)`, split into batches so
+    higher-priority calls can get in between the batches of a large upload.
+    """
+    batch_size = get_settings().embedding_batch_size
+    vectors = []
+    for i in range(0, len(texts), batch_size):
+        batch = texts[i:i + batch_size]
+        tokens = sum(estimate_tokens(t) for t in batch)
+        with span('llm.embed_documents', kind='llm', texts=len(batch),
+                  estimated_tokens=tokens):
+            vectors.extend(get_scheduler().call(
+                lambda: embeddings.embed_documents(batch),
+                priority=priority, tokens=tokens))
+    return vectors
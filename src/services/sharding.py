@@ -0,0 +1,75 @@
+import re
+from typing import Dict, List, Optional
+from src.config import get_settings
+
+# Shard for material with no clear jurisdiction. It maps to the original
+# unsharded collection, so documents indexed before sharding stay searchable.
+GENERAL_SHARD = 'general'
+
+# Signals that a text is about a given jurisdiction. Acronyms are
+# case-sensitive (so 'mas' in prose does not match); names are not.
+JURISDICTION_PATTERNS: Dict[str, List[str]] = {
+    'hk': [r'\bHKMA\b', r'(?i:\bhong kong\b)', r'\bHK-\d{4}-\d{3}\b', r'\bSFC\b', r'\bHKD\b'],
+    'sg': [r'\bMAS\b', r'(?i:\bsingapore\b)', r'\bSG-\d{4}-\d{3}\b', r'\bPDPA\b', r'\bSGD\b'],
+    'fatf': [r'\bFATF\b'],
+}
+
+
+def configured_shards() -> List[str]:
+    """Jurisdiction shards from settings, plus the general shard."""
+    shards = [s.strip().lower() for s in get_settings().jurisdiction_shards.split(',')]
+    return [s for s in shards if s] + [GENERAL_SHARD]
+
+
+def shard_collection(shard: str) -> str:
+    settings = get_settings()
+    if not settings.enable_sharding or shard == GENERAL_SHARD:
+        return settings.qdrant_collection
+    return f'{settings.qdrant_collection}_{shard}'
+
+
+def _mentions(text: str) -> Dict[str, int]:
+    counts = {}
+    for shard in configured_shards():
+        patterns = JURISDICTION_PATTERNS.get(shard, [rf'(?i:\b{re.escape(shard)}\b)'])
+        hits = sum(len(re.findall(p, text)) for p in patterns)
+        if hits:
+            counts[shard] = hits
+    return counts
+
+
+def detect_document_jurisdiction(text: str, filename: str = '') -> str:
+    """
+    Pick the single shard a document belongs to: the jurisdiction it
+    mentions most (e.g. an HK report citing FATF once is still HK).
+    """
+    counts = _mentions(f'{filename}\n{text}')
+    if not counts:
+        return GENERAL_SHARD
+    return max(counts, key=counts.get)
+
+
+def validate_shards(shards: List[str]) -> List[str]:
+    known = configured_shards()
+    cleaned = [s.strip().lower() for s in shards]
+    unknown = [s for s in cleaned if s not in known]
+    if unknown:
+        raise ValueError(f'Unknown jurisdiction(s) {unknown}; expected one of {known}')
+    return cleaned
+
+
+def route_query(question: str, jurisdictions: Optional[List[str]] = None) -> List[str]:
+    """
+    Decide which shards a question should search. Explicit jurisdictions
+    win; otherwise the ones the question mentions; otherwise all shards.
+    The general shard is always included.
+    """
+    if not get_settings().enable_sharding:
+        return [GENERAL_SHARD]
+    if jurisdictions:
+        shards = validate_shards(jurisdictions)
+    else:
+        shards = list(_mentions(question)) or configured_shards()
+    if GENERAL_SHARD not in shards:
+        shards.append(GENERAL_SHARD)
+    return shards
@@ -0,0 +1,227 @@
+import argparse
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import time
+from array import array
+from typing import List, Optional
+import numpy as np
+from src.config import get_settings
+from src.services.vector_store import get_vector_store
+
+logger = logging.getLogger(__name__)
+
+# Snapshot layout (little-endian), one section after the other:
+#   MAGIC | u32 version | u32 header length | JSON header | padding
+#   vectors       count x dim float32, contiguous (memory-mappable)
+#   id_offsets    (count + 1) uint64  -> ids       UTF-8 point IDs
+#   payload_offsets (count + 1) uint64 -> payloads UTF-8 JSON payloads
+# Points are grouped by collection; the header lists each collection's
+# first row and row count. Sections start on 64-byte boundaries.
+MAGIC = b'ARAGSNAP'
+VERSION = 1
+ALIGNMENT = 64
+SECTIONS = ['vectors', 'id_offsets', 'ids', 'payload_offsets', 'payloads']
+
+
+def managed_collections(store) -> List[str]:
+    """Every collection this app owns: the document shards and the summary index."""
+    settings = get_settings()
+    return sorted(n for n in store.list_collections()
+                  if n == settings.qdrant_collection
+                  or n.startswith(f'{settings.qdrant_collection}_')
+                  or n == settings.qdrant_summary_collection)
+
+
+def _pad(n: int) -> int:
+    return (ALIGNMENT - n % ALIGNMENT) % ALIGNMENT
+
+
+def export_snapshot(path: str, collections: Optional[List[str]] = None,
+                    batch_size: int = 1000) -> dict:
+    """
+    Stream every point (vector, payload, ID) of the given collections into
+    a single snapshot file. Sections are spooled to temporary files while
+    scrolling, so memory use does not grow with the corpus.
+    """
+    settings = get_settings()
+    store = get_vector_store()
+    if collections is None:
+        collections = managed_collections(store)
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as tmp:
+        parts = {name: open(os.path.join(tmp, name), 'wb') for name in ('vectors', 'ids', 'payloads')}
+        id_offsets, payload_offsets = array('Q', [0]), array('Q', [0])
+        dim, count, layout = None, 0, []
+        try:
+            for collection in collections:
+                first_row = count
+                for ids, vectors, payloads in store.scroll(collection, batch_size):
+                    vectors = vectors.astype('<f4', copy=False)
+                    if dim is None:
+                        dim = vectors.shape[1]
+                    elif vectors.shape[1] != dim:
+                        raise ValueError(f'{collection} has {vectors.shape[1]}-d vectors, '
+                                         f'expected {dim}')
+                    parts['vectors'].write(vectors.tobytes())
+                    for point_id, payload in zip(ids, payloads):
+                        id_offsets.append(id_offsets[-1] + parts['ids'].write(str(point_id).encode()))
+                        payload_offsets.append(payload_offsets[-1] + parts['payloads'].write(
+                            json.dumps(payload, separators=(',', ':')).encode()))
+                    count += len(ids)
+                layout.append({'name': collection, 'start': first_row, 'count': count - first_row})
+                logger.info(f'Exported {count - first_row} points from {collection}')
+        finally:
+            for f in parts.values():
+                f.close()
+
+        section_files = {
+            'vectors': os.path.join(tmp, 'vectors'),
+            'id_offsets': id_offsets.tobytes(),
+            'ids': os.path.join(tmp, 'ids'),
+            'payload_offsets': payload_offsets.tobytes(),
+            'payloads': os.path.join(tmp, 'payloads'),
+        }
+        sizes = {name: len(src) if isinstance(src, bytes) else os.path.getsize(src)
+                 for name, src in section_files.items()}
+        header = {
+            'version': VERSION,
+            'embedding_model': settings.openai_embedding_model,
+            'dim': dim or 0,
+            'count': count,
+            'dtype': 'float32',
+            'collections': layout,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        }
+        # Section offsets depend on the header's own length: repeat until stable
+        header['sections'] = {}
+        while True:
+            header_bytes = json.dumps(header).encode()
+            position = len(MAGIC) + 8 + len(header_bytes)
+            position += _pad(position)
+            sections = {}
+            for name in SECTIONS:
+                sections[name] = [position, sizes[name]]
+                position += sizes[name] + _pad(sizes[name])
+            if sections == header['sections']:
+                break
+            header['sections'] = sections
+
+        with open(path, 'wb') as out:
+            out.write(MAGIC + struct.pack('<II', VERSION, len(header_bytes)) + header_bytes)
+            for name in SECTIONS:
+                out.write(b'\0' * (sections[name][0] - out.tell()))
+                src = section_files[name]
+                if isinstance(src, bytes):
+                    out.write(src)
+                else:
+                    with open(src, 'rb') as f:
+                        shutil.copyfileobj(f, out, 16 * 1024 * 1024)
+
+    summary = {'path': path, 'points': count, 'dim': dim, 'collections': layout,
+               'bytes': os.path.getsize(path),
+               'seconds': round(time.perf_counter() - started, 2)}
+    logger.info(f'Snapshot exported: {summary}')
+    return summary
+
+
+def read_header(path: str) -> dict:
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not an index snapshot')
+        version, header_len = struct.unpack('<II', f.read(8))
+        if version != VERSION:
+            raise ValueError(f'Unsupported snapshot version {version}')
+        return json.loads(f.read(header_len))
+
+
+def import_snapshot(path: str, force: bool = False, batch_size: int = 256) -> dict:
+    """
+    Bulk-load a snapshot with batched upserts and zero embedding calls.
+    Vectors, IDs and payloads are read lazily from a memory map, so only
+    the batch being uploaded is materialised in memory.
+    Refuses snapshots built with a different embedding model unless `force`.
+    """
+    settings = get_settings()
+    header = read_header(path)
+    if header['embedding_model'] != settings.openai_embedding_model and not force:
+        raise ValueError(
+            f"Snapshot was embedded with {header['embedding_model']!r} but this "
+            f'environment uses {settings.openai_embedding_model!r}; pass force=True to load anyway')
+    store = get_vector_store()
+    started = time.perf_counter()
+    count, dim, sections = header['count'], header['dim'], header['sections']
+    if count == 0:
+        return {'path': path, 'points': 0, 'collections': header['collections'], 'seconds': 0.0}
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        vectors = np.frombuffer(mm, dtype='<f4', count=count * dim,
+                                offset=sections['vectors'][0]).reshape(count, dim)
+        id_offsets = np.frombuffer(mm, dtype='<u8', count=count + 1,
+                                   offset=sections['id_offsets'][0])
+        payload_offsets = np.frombuffer(mm, dtype='<u8', count=count + 1,
+                                        offset=sections['payload_offsets'][0])
+        ids_start, payloads_start = sections['ids'][0], sections['payloads'][0]
+
+        def ids(start, stop):
+            for i in range(start, stop):
+                raw = mm[ids_start + int(id_offsets[i]):ids_start + int(id_offsets[i + 1])].decode()
+                yield int(raw) if raw.isdigit() else raw
+
+        def payloads(start, stop):
+            for i in range(start, stop):
+                yield json.loads(mm[payloads_start + int(payload_offsets[i]):
+                                    payloads_start + int(payload_offsets[i + 1])])
+
+        try:
+            for entry in header['collections']:
+                start, stop = entry['start'], entry['start'] + entry['count']
+                store.ensure_collection(entry['name'], dim=dim)
+                for batch_start in range(start, stop, batch_size):
+                    batch_stop = min(batch_start + batch_size, stop)
+                    # A copy, not a view: a failing upsert's traceback must
+                    # not pin the memory map open
+                    store.upsert(entry['name'], list(ids(batch_start, batch_stop)),
+                                 np.array(vectors[batch_start:batch_stop]),
+                                 list(payloads(batch_start, batch_stop)))
+                logger.info(f"Imported {entry['count']} points into {entry['name']}")
+        finally:
+            # Release the buffer views before the memory map closes, even on
+            # error, or mm.close() raises BufferError and hides the real one
+            del vectors, id_offsets, payload_offsets
+
+    summary = {'path': path, 'points': count, 'collections': header['collections'],
+               'seconds': round(time.perf_counter() - started, 2)}
+    logger.info(f'Snapshot imported: {summary}')
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Export or import the indexed corpus as a compact binary snapshot.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help='Write all managed collections to a snapshot file')
+    export.add_argument('path')
+    export.add_argument('--collection', action='append', dest='collections',
+                        help='Only export this collection (repeatable)')
+    export.add_argument('--batch-size', type=int, default=1000)
+    load = sub.add_parser('import', help='Bulk-load a snapshot file (no embedding calls)')
+    load.add_argument('path')
+    load.add_argument('--force', action='store_true',
+                      help='Load even if the embedding model tag does not match')
+    load.add_argument('--batch-size', type=int, default=256)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'export':
+        result = export_snapshot(args.path, args.collections, args.batch_size)
+    else:
+        result = import_snapshot(args.path, args.force, args.batch_size)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
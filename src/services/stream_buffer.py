@@ -0,0 +1,138 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class StreamRun:
+    """
+    Server-side buffer of the SSE events produced by one /agent/stream run.
+    The graph keeps writing here even if the client disconnects, so a
+    reconnect can replay what it missed and follow the same execution.
+    """
+
+    def __init__(self, thread_id: str, message: str):
+        self.run_id = uuid.uuid4().hex
+        self.thread_id = thread_id
+        self.message = message
+        self.events: List[str] = []        # JSON-encoded event payloads
+        self.done = False
+        self.updated_at = time.monotonic()
+        self._cond = threading.Condition()
+        # Async readers waiting on an event loop: (loop, asyncio.Event)
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    def _notify(self):
+        """Wake every reader; called with self._cond held."""
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def append(self, event: dict):
+        with self._cond:
+            self.events.append(json.dumps(event))
+            self.updated_at = time.monotonic()
+            self._notify()
+
+    def finish(self):
+        with self._cond:
+            self.done = True
+            self.updated_at = time.monotonic()
+            self._notify()
+
+    def wait_for(self, after: int, timeout: float) -> Tuple[List[str], bool]:
+        """
+        Return the events after sequence number `after` (1-based), blocking
+        up to `timeout` seconds if there are none yet. Also returns whether
+        the run has finished.
+        """
+        with self._cond:
+            if len(self.events) <= after and not self.done:
+                self._cond.wait(timeout)
+            return self.events[after:], self.done
+
+    async def wait_for_async(self, after: int, timeout: float) -> Tuple[List[str], bool]:
+        """
+        wait_for for async callers: waits on the event loop instead of
+        blocking a worker thread, so idle SSE clients cost no threads.
+        """
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            if len(self.events) > after or self.done:
+                return self.events[after:], self.done
+            self._async_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._async_waiters.remove(waiter)
+        with self._cond:
+            return self.events[after:], self.done
+
+    def event_id(self, seq: int) -> str:
+        return f'{self.run_id}:{seq}'
+
+
+class StreamBufferStore:
+    """
+    In-memory registry of stream runs with a TTL on finished runs.
+    Buffers are per API process: run a single worker (or sticky sessions)
+    for reconnects to find their run.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._runs: Dict[str, StreamRun] = {}
+        self._active_by_thread: Dict[str, StreamRun] = {}
+        self._lock = threading.Lock()
+
+    def create(self, thread_id: str, message: str) -> StreamRun:
+        run = StreamRun(thread_id, message)
+        with self._lock:
+            self._evict_expired()
+            self._runs[run.run_id] = run
+            self._active_by_thread[thread_id] = run
+        return run
+
+    def get(self, run_id: str) -> Optional[StreamRun]:
+        with self._lock:
+            return self._runs.get(run_id)
+
+    def active_for_thread(self, thread_id: str) -> Optional[StreamRun]:
+        """The still-running stream for a thread, if there is one."""
+        with self._lock:
+            run = self._active_by_thread.get(thread_id)
+            return run if run is not None and not run.done else None
+
+    def _evict_expired(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [rid for rid, run in self._runs.items()
+                   if run.done and run.updated_at < cutoff]
+        for rid in expired:
+            run = self._runs.pop(rid)
+            if self._active_by_thread.get(run.thread_id) is run:
+                del self._active_by_thread[run.thread_id]
+        if expired:
+            logger.debug(f'Evicted {len(expired)} expired stream buffers')
+
+
+def parse_last_event_id(last_event_id: str) -> Tuple[str, int]:
+    """Split a '<run_id>:<seq>' SSE event ID into its parts."""
+    run_id, _, seq = last_event_id.rpartition(':')
+    if not run_id or not seq.isdigit():
+        raise ValueError(f'Malformed Last-Event-ID: {last_event_id!r}')
+    return run_id, int(seq)
+
+
+@lru_cache()
+def get_stream_store() -> StreamBufferStore:
+    return StreamBufferStore(ttl_seconds=get_settings().stream_buffer_ttl_seconds)
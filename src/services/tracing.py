@@ -0,0 +1,118 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache, wraps
+from typing import Callable, List, Optional
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Which conversation, and which span, the current code is running under.
+# Context variables follow LangGraph into its worker threads, so spans
+# opened inside parallel nodes still attach to the right parent.
+_current_thread_id: ContextVar[Optional[str]] = ContextVar('trace_thread_id', default=None)
+_current_span: ContextVar[Optional[dict]] = ContextVar('trace_span', default=None)
+
+
+class SpanRecorder:
+    """
+    Keeps the most recent spans per thread_id in a bounded ring buffer,
+    and only the most recently active threads (LRU), so memory stays flat.
+    """
+
+    def __init__(self, max_spans_per_thread: int, max_threads: int):
+        self.max_spans_per_thread = max_spans_per_thread
+        self.max_threads = max_threads
+        self._spans: 'OrderedDict[str, deque]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, thread_id: str, span: dict):
+        with self._lock:
+            spans = self._spans.get(thread_id)
+            if spans is None:
+                spans = self._spans[thread_id] = deque(maxlen=self.max_spans_per_thread)
+            self._spans.move_to_end(thread_id)
+            spans.append(span)
+            while len(self._spans) > self.max_threads:
+                self._spans.popitem(last=False)
+
+    def get(self, thread_id: str) -> List[dict]:
+        with self._lock:
+            spans = list(self._spans.get(thread_id, ()))
+        return sorted(spans, key=lambda s: s['start'])
+
+
+@lru_cache()
+def get_recorder() -> SpanRecorder:
+    settings = get_settings()
+    return SpanRecorder(max_spans_per_thread=settings.trace_max_spans_per_thread,
+                        max_threads=settings.trace_max_threads)
+
+
+@contextmanager
+def trace_context(thread_id: str):
+    """Attribute every span opened inside this block to `thread_id`."""
+    token = _current_thread_id.set(thread_id)
+    try:
+        yield
+    finally:
+        _current_thread_id.reset(token)
+
+
+@contextmanager
+def span(name: str, kind: str = 'internal', **attributes):
+    """
+    Time a block of work. Yields the span's attribute dict so callers can
+    add details (e.g. token counts) once they are known. Outside of a
+    trace_context this is a no-op.
+    """
+    thread_id = _current_thread_id.get()
+    if thread_id is None:
+        yield attributes
+        return
+    parent = _current_span.get()
+    span_id = uuid.uuid4().hex[:16]
+    record = {
+        'span_id': span_id,
+        'parent_id': parent['span_id'] if parent else None,
+        # One trace per request: the root span's ID, inherited by children
+        'trace_id': parent['trace_id'] if parent else span_id,
+        'name': name,
+        'kind': kind,
+        'start': time.time(),
+        'duration_ms': None,
+        'status': 'ok',
+        'attributes': attributes,
+    }
+    token = _current_span.set(record)
+    started = time.perf_counter()
+    try:
+        yield attributes
+    except Exception as e:
+        # interrupt() pauses the graph by raising; that is not a failure
+        if type(e).__name__ == 'GraphInterrupt':
+            record['status'] = 'interrupted'
+        else:
+            record['status'] = 'error'
+            attributes['error'] = str(e)
+        raise
+    finally:
+        record['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        _current_span.reset(token)
+        get_recorder().record(thread_id, record)
+
+
+def traced_node(name: str, fn: Callable) -> Callable:
+    """Wrap a graph node so each execution is recorded as a 'node' span."""
+    @wraps(fn)
+    def wrapper(state):
+        thread_id = _current_thread_id.get() or state.get('thread_id')
+        if not thread_id:
+            return fn(state)
+        with trace_context(thread_id), span(name, kind='node'):
+            return fn(state)
+    return wrapper
@@ -0,0 +1,456 @@
+import json
+import logging
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Payload filters are {field: [accepted values]}; a point matches when every
+# listed field holds one of its accepted values.
+PayloadFilter = Dict[str, List]
+
+
+@dataclass
+class SearchHit:
+    id: object
+    score: float
+    payload: dict
+
+
+class VectorStore(ABC):
+    """
+    Retrieval backend interface. Collections hold (id, vector, payload)
+    points and are searched by cosine similarity.
+    """
+    name = 'base'
+
+    @abstractmethod
+    def list_collections(self) -> List[str]: ...
+
+    @abstractmethod
+    def collection_exists(self, collection: str) -> bool: ...
+
+    @abstractmethod
+    def ensure_collection(self, collection: str, dim: int = 1536): ...
+
+    @abstractmethod
+    def delete_collection(self, collection: str): ...
+
+    @abstractmethod
+    def count(self, collection: str) -> int: ...
+
+    @abstractmethod
+    def upsert(self, collection: str, ids: list, vectors, payloads: List[dict]): ...
+
+    @abstractmethod
+    def search_batch(self, collection: str, vectors, top_k: int,
+                     payload_filter: Optional[PayloadFilter] = None,
+                     ids: Optional[list] = None) -> List[List[SearchHit]]:
+        """Top_k hits per vector; `ids` restricts the search to those points."""
+
+    @abstractmethod
+    def retrieve(self, collection: str, ids: list) -> List[SearchHit]:
+        """Fetch points by ID (score 0.0); unknown IDs are skipped."""
+
+    @abstractmethod
+    def scroll(self, collection: str,
+               batch_size: int = 1000) -> Iterator[Tuple[list, np.ndarray, List[dict]]]:
+        """Yield (ids, vectors, payloads) batches covering the whole collection."""
+
+    def search(self, collection: str, vector, top_k: int,
+               payload_filter: Optional[PayloadFilter] = None,
+               ids: Optional[list] = None) -> List[SearchHit]:
+        return self.search_batch(collection, [vector], top_k, payload_filter, ids)[0]
+
+
+class QdrantVectorStore(VectorStore):
+    """The default backend: the Qdrant service (or in-process Qdrant for ':memory:')."""
+    name = 'qdrant'
+
+    def __init__(self, client):
+        self.client = client
+        # Collections seen to exist: saves an HTTP round trip per shard per
+        # search. Only positives are cached, so new collections are found.
+        self._known = set()
+
+    def list_collections(self) -> List[str]:
+        return [c.name for c in self.client.get_collections().collections]
+
+    def collection_exists(self, collection: str) -> bool:
+        if collection in self._known:
+            return True
+        exists = self.client.collection_exists(collection)
+        if exists:
+            self._known.add(collection)
+        return exists
+
+    def ensure_collection(self, collection: str, dim: int = 1536):
+        from src.services.clients import ensure_collection
+        if collection not in self._known:
+            ensure_collection(self.client, collection, size=dim)
+            self._known.add(collection)
+
+    def delete_collection(self, collection: str):
+        self._known.discard(collection)
+        self.client.delete_collection(collection)
+
+    def count(self, collection: str) -> int:
+        return self.client.count(collection).count
+
+    def upsert(self, collection: str, ids: list, vectors, payloads: List[dict]):
+        from qdrant_client.models import Batch
+        self.client.upsert(collection_name=collection, points=Batch(
+            ids=list(ids), vectors=np.asarray(vectors, dtype=np.float32).tolist(),
+            payloads=list(payloads)))
+
+    def _filter(self, payload_filter: Optional[PayloadFilter], ids: Optional[list] = None):
+        if not payload_filter and ids is None:
+            return None
+        from qdrant_client.models import FieldCondition, Filter, HasIdCondition, MatchAny
+        must = [FieldCondition(key=key, match=MatchAny(any=list(values)))
+                for key, values in (payload_filter or {}).items()]
+        if ids is not None:
+            must.append(HasIdCondition(has_id=list(ids)))
+        return Filter(must=must)
+
+    def search_batch(self, collection: str, vectors, top_k: int,
+                     payload_filter: Optional[PayloadFilter] = None,
+                     ids: Optional[list] = None) -> List[List[SearchHit]]:
+        query_filter = self._filter(payload_filter, ids)
+        results = []
+        for vector in vectors:
+            points = self.client.query_points(
+                collection_name=collection,
+                query=list(map(float, vector)),
+                query_filter=query_filter,
+                limit=top_k,
+                with_payload=True
+            ).points
+            results.append([SearchHit(p.id, p.score, p.payload) for p in points])
+        return results
+
+    def retrieve(self, collection: str, ids: list) -> List[SearchHit]:
+        points = self.client.retrieve(collection_name=collection, ids=list(ids),
+                                      with_payload=True)
+        return [SearchHit(p.id, 0.0, p.payload) for p in points]
+
+    def scroll(self, collection: str, batch_size: int = 1000):
+        offset = None
+        while True:
+            points, offset = self.client.scroll(collection_name=collection, limit=batch_size,
+                                                offset=offset, with_payload=True,
+                                                with_vectors=True)
+            if points:
+                yield ([p.id for p in points],
+                       np.asarray([p.vector for p in points], dtype=np.float32),
+                       [p.payload for p in points])
+            if offset is None:
+                return
+
+
+class EmbeddedCollection:
+    """
+    One collection on local disk:
+      meta.json       dimension and storage dtype
+      vectors.bin     row-major matrix, float32 or int8, memory-mapped for search
+      scales.bin      per-row float32 scale (int8 storage only)
+      points.jsonl    append-only {"row", "id", "payload"} log; last entry per row wins
+    Vectors are L2-normalised on write, so cosine similarity is a dot product.
+    """
+
+    # Rows scored per matrix multiply; bounds temporary memory on big collections
+    BLOCK_ROWS = 65536
+    # Payload fields indexed in memory while the log is loaded, so filtered
+    # searches never read payloads from disk; other fields are indexed on
+    # first use with one sequential pass over the log
+    INDEXED_FIELDS = ('jurisdiction', 'source')
+
+    def __init__(self, path: str, dim: int = None, dtype: str = 'float32'):
+        self.path = path
+        self._lock = threading.RLock()
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        else:
+            if dim is None:
+                raise FileNotFoundError(f'No embedded collection at {path}')
+            os.makedirs(path, exist_ok=True)
+            meta = {'dim': dim, 'dtype': dtype}
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f)
+            for name in ('vectors.bin', 'scales.bin', 'points.jsonl'):
+                open(os.path.join(path, name), 'ab').close()
+        self.dim = meta['dim']
+        self.dtype = np.dtype(meta['dtype'])
+        self.quantized = self.dtype == np.int8
+        self._load_points()
+        self._matrix = self._scales = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _read_log(self, start: int, stop: int):
+        """Yield (offset, entry) for the log entries between two byte offsets."""
+        with open(self._file('points.jsonl'), 'rb') as f:
+            f.seek(start)
+            offset = start
+            while offset < stop:
+                line = f.readline()
+                if not line:
+                    break
+                yield offset, json.loads(line)
+                offset += len(line)
+
+    @staticmethod
+    def _index_value(value):
+        # Only scalars can be matched by a filter (and hashed into a set)
+        return value if isinstance(value, (str, int, float, bool)) else None
+
+    def _load_points(self):
+        """Rebuild the row index (IDs, payload offsets, indexed fields) from the point log."""
+        self.ids, self.row_of, self.payload_offsets = [], {}, []
+        self._field_index: Dict[str, list] = {field: [] for field in self.INDEXED_FIELDS}
+        self._log_size = os.path.getsize(self._file('points.jsonl'))
+        for offset, entry in self._read_log(0, self._log_size):
+            row = entry['row']
+            if row == len(self.ids):
+                self.ids.append(entry['id'])
+                self.payload_offsets.append(offset)
+                for values in self._field_index.values():
+                    values.append(None)
+            else:
+                self.payload_offsets[row] = offset
+            self.row_of[entry['id']] = row
+            for field, values in self._field_index.items():
+                values[row] = self._index_value(entry['payload'].get(field))
+
+    @property
+    def count(self) -> int:
+        return len(self.ids)
+
+    def _views(self):
+        """Memory-mapped vectors (and scales), reopened after every write."""
+        if self._matrix is None:
+            if self.count == 0:
+                self._matrix = np.zeros((0, self.dim), dtype=self.dtype)
+                self._scales = np.zeros(0, dtype=np.float32)
+            else:
+                self._matrix = np.memmap(self._file('vectors.bin'), dtype=self.dtype,
+                                         mode='r', shape=(self.count, self.dim))
+                if self.quantized:
+                    self._scales = np.memmap(self._file('scales.bin'), dtype=np.float32,
+                                             mode='r', shape=(self.count,))
+        return self._matrix, self._scales
+
+    def _encode(self, vectors: np.ndarray):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        if not self.quantized:
+            return vectors.astype(np.float32), None
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales = np.where(scales == 0, 1, scales).astype(np.float32)
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales
+
+    def upsert(self, ids: list, vectors, payloads: List[dict]):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        encoded, scales = self._encode(vectors)
+        row_bytes = self.dim * self.dtype.itemsize
+        with self._lock:
+            self._matrix = self._scales = None
+            with open(self._file('vectors.bin'), 'r+b') as vf, \
+                    open(self._file('scales.bin'), 'r+b') as sf, \
+                    open(self._file('points.jsonl'), 'ab') as log:
+                for i, (point_id, payload) in enumerate(zip(ids, payloads)):
+                    row = self.row_of.get(point_id)
+                    if row is None:                 # new point: append a row
+                        row = len(self.ids)
+                        self.ids.append(point_id)
+                        self.payload_offsets.append(self._log_size)
+                        self.row_of[point_id] = row
+                        for values in self._field_index.values():
+                            values.append(None)
+                    else:                           # existing point: overwrite in place
+                        self.payload_offsets[row] = self._log_size
+                    vf.seek(row * row_bytes)
+                    vf.write(encoded[i].tobytes())
+                    if scales is not None:
+                        sf.seek(row * 4)
+                        sf.write(scales[i].tobytes())
+                    line = (json.dumps({'row': row, 'id': point_id, 'payload': payload},
+                                       separators=(',', ':')) + '\n').encode()
+                    log.write(line)
+                    self._log_size += len(line)
+                    for field, values in self._field_index.items():
+                        values[row] = self._index_value(payload.get(field))
+
+    def payload(self, row: int) -> dict:
+        with open(self._file('points.jsonl'), 'rb') as f:
+            f.seek(self.payload_offsets[row])
+            return json.loads(f.readline())['payload']
+
+    def _index_field(self, field: str) -> list:
+        """Index a field outside INDEXED_FIELDS, reading the log sequentially."""
+        with self._lock:
+            if field in self._field_index:
+                return self._field_index[field]
+            scanned = self._log_size
+        # The bulk of the log is read without the lock, so searches and
+        # writes carry on; only entries written meanwhile are read under it
+        values = {}
+        for _, entry in self._read_log(0, scanned):
+            values[entry['row']] = self._index_value(entry['payload'].get(field))
+        with self._lock:
+            if field not in self._field_index:
+                for _, entry in self._read_log(scanned, self._log_size):
+                    values[entry['row']] = self._index_value(entry['payload'].get(field))
+                self._field_index[field] = [values.get(r) for r in range(self.count)]
+            return self._field_index[field]
+
+    def _mask(self, columns: Dict[str, list], payload_filter: PayloadFilter, n: int) -> np.ndarray:
+        """Boolean mask over the first `n` rows from the in-memory field index."""
+        mask = np.ones(n, dtype=bool)
+        for field, accepted in payload_filter.items():
+            accepted = set(accepted)
+            mask &= np.fromiter((v in accepted for v in columns[field][:n]),
+                                dtype=bool, count=n)
+        return mask
+
+    def search_batch(self, queries, top_k: int, payload_filter: Optional[PayloadFilter] = None,
+                     point_ids: Optional[list] = None) -> List[List[SearchHit]]:
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        columns = {field: self._index_field(field) for field in payload_filter or {}}
+        # Only the snapshot needs the lock; scoring and payload reads run
+        # unlocked so concurrent searches overlap (NumPy matmul releases the
+        # GIL). New points only append rows past `n`, but re-upserting an
+        # existing ID overwrites its row in place, so a search racing that
+        # write can score a half-written vector or read the newer payload.
+        # Accepted: ingestion writes fresh IDs, and re-upserts are rare.
+        with self._lock:
+            matrix, scales = self._views()
+            ids = self.ids
+            n = matrix.shape[0]
+            if point_ids is not None:
+                rows = [self.row_of[i] for i in point_ids if i in self.row_of]
+        if n == 0:
+            return [[] for _ in queries]
+        mask = self._mask(columns, payload_filter, n) if payload_filter else None
+        if point_ids is not None:
+            restricted = np.zeros(n, dtype=bool)
+            restricted[rows] = True
+            mask = restricted if mask is None else mask & restricted
+        # Brute force: one matrix multiply per block of rows, for all queries at once
+        scores = np.empty((len(queries), n), dtype=np.float32)
+        for start in range(0, n, self.BLOCK_ROWS):
+            block = matrix[start:start + self.BLOCK_ROWS]
+            block_scores = queries @ block.astype(np.float32, copy=False).T
+            if self.quantized:
+                block_scores *= scales[start:start + self.BLOCK_ROWS]
+            scores[:, start:start + self.BLOCK_ROWS] = block_scores
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+        k = min(top_k, n)
+        results = []
+        for row_scores in scores:
+            top = np.argpartition(-row_scores, k - 1)[:k]
+            top = top[np.argsort(-row_scores[top])]
+            results.append([SearchHit(ids[r], float(row_scores[r]), self.payload(r))
+                            for r in top if np.isfinite(row_scores[r])])
+        return results
+
+    def retrieve(self, ids: list) -> List[SearchHit]:
+        with self._lock:
+            rows = [self.row_of[i] for i in ids if i in self.row_of]
+        return [SearchHit(self.ids[r], 0.0, self.payload(r)) for r in rows]
+
+    def scroll(self, batch_size: int = 1000):
+        with self._lock:
+            matrix, scales = self._views()
+            count = self.count
+        for start in range(0, count, batch_size):
+            stop = min(start + batch_size, count)
+            vectors = np.asarray(matrix[start:stop], dtype=np.float32)
+            if self.quantized:
+                vectors = vectors * scales[start:stop, None]
+            yield (self.ids[start:stop], vectors,
+                   [self.payload(r) for r in range(start, stop)])
+
+
+class EmbeddedVectorStore(VectorStore):
+    """
+    In-process backend: one EmbeddedCollection directory per collection
+    under `root`. No network hop and no extra service; meant for tests and
+    small-to-mid deployments (up to a few hundred thousand chunks).
+    """
+    name = 'embedded'
+
+    def __init__(self, root: str, dtype: str = 'float32'):
+        self.root = root
+        self.dtype = dtype
+        self._collections: Dict[str, EmbeddedCollection] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _collection(self, collection: str) -> EmbeddedCollection:
+        with self._lock:
+            if collection not in self._collections:
+                self._collections[collection] = EmbeddedCollection(
+                    os.path.join(self.root, collection))
+            return self._collections[collection]
+
+    def list_collections(self) -> List[str]:
+        return sorted(d for d in os.listdir(self.root)
+                      if os.path.exists(os.path.join(self.root, d, 'meta.json')))
+
+    def collection_exists(self, collection: str) -> bool:
+        return os.path.exists(os.path.join(self.root, collection, 'meta.json'))
+
+    def ensure_collection(self, collection: str, dim: int = 1536):
+        with self._lock:
+            if collection not in self._collections:
+                self._collections[collection] = EmbeddedCollection(
+                    os.path.join(self.root, collection), dim=dim, dtype=self.dtype)
+
+    def delete_collection(self, collection: str):
+        with self._lock:
+            self._collections.pop(collection, None)
+            shutil.rmtree(os.path.join(self.root, collection), ignore_errors=True)
+
+    def count(self, collection: str) -> int:
+        return self._collection(collection).count
+
+    def upsert(self, collection: str, ids: list, vectors, payloads: List[dict]):
+        self._collection(collection).upsert(ids, vectors, payloads)
+
+    def search_batch(self, collection: str, vectors, top_k: int,
+                     payload_filter: Optional[PayloadFilter] = None,
+                     ids: Optional[list] = None) -> List[List[SearchHit]]:
+        return self._collection(collection).search_batch(vectors, top_k, payload_filter, ids)
+
+    def retrieve(self, collection: str, ids: list) -> List[SearchHit]:
+        return self._collection(collection).retrieve(ids)
+
+    def scroll(self, collection: str, batch_size: int = 1000):
+        return self._collection(collection).scroll(batch_size)
+
+
+@lru_cache()
+def get_vector_store() -> VectorStore:
+    settings = get_settings()
+    if settings.vector_backend == 'embedded':
+        return EmbeddedVectorStore(settings.embedded_index_path,
+                                   dtype=settings.embedded_index_dtype)
+    if settings.vector_backend != 'qdrant':
+        raise ValueError(f'Unknown VECTOR_BACKEND {settings.vector_backend!r}; '
+                         "expected 'qdrant' or 'embedded'")
+    from src.services.clients import get_qdrant_client
+    return QdrantVectorStore(get_qdrant_client())
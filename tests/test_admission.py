@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from src.services.admission import AdmissionController, AdmissionRejected
+
+
+def test_sheds_load_when_queue_is_full():
+    async def scenario():
+        admission = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=5)
+        await admission.acquire('a')
+        waiter = asyncio.create_task(admission.acquire('b'))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire('c')
+        assert rejected.value.status_code == 503
+        assert admission.stats()['queued'] == 1
+        admission.release('a')        # the slot goes straight to the waiter
+        await waiter
+        stats = admission.stats()
+        assert stats['active'] == 1 and stats['admitted'] == 2
+        assert stats['rejected']['queue_full'] == 1
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_rejects_with_503():
+    async def scenario():
+        admission = AdmissionController(max_concurrency=1, max_queue=4, queue_timeout=0.05)
+        await admission.acquire('a')
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire('b')
+        assert rejected.value.status_code == 503
+        assert admission.stats()['queued'] == 0 and admission.stats()['busy_threads'] == 1
+    asyncio.run(scenario())
+
+
+def test_same_thread_is_serialised_or_rejected():
+    async def scenario():
+        order = []
+        admission = AdmissionController(max_concurrency=4, max_queue=4, queue_timeout=5)
+
+        async def run(tag):
+            async with admission.slot('t1'):
+                order.append(f'{tag} start')
+                await asyncio.sleep(0.01)
+                order.append(f'{tag} end')
+        await asyncio.gather(run('first'), run('second'))
+        assert order == ['first start', 'first end', 'second start', 'second end']
+        assert admission.stats()['busy_threads'] == 0 and admission.stats()['active'] == 0
+
+        strict = AdmissionController(max_concurrency=4, max_queue=4, queue_timeout=5,
+                                     thread_policy='reject')
+        await strict.acquire('t1')
+        with pytest.raises(AdmissionRejected) as rejected:
+            await strict.acquire('t1')
+        assert rejected.value.status_code == 429
+        await strict.acquire('t2')      # other threads are unaffected
+    asyncio.run(scenario())
+
+
+def test_handoff_racing_the_timeout_is_admitted(monkeypatch):
+    from src.services import admission as admission_module
+
+    async def scenario():
+        admission = AdmissionController(max_concurrency=1, max_queue=4, queue_timeout=5)
+        await admission.acquire('a')
+
+        async def racing_wait_for(future, timeout):
+            admission.release('a')          # hands the slot to the waiter...
+            raise asyncio.TimeoutError       # ...in the same instant the timeout fires
+        monkeypatch.setattr(admission_module.asyncio, 'wait_for', racing_wait_for)
+        await admission.acquire('b')
+        assert admission.stats()['active'] == 1 and admission.stats()['busy_threads'] == 1
+        admission.release('b')
+        stats = admission.stats()
+        assert stats['active'] == 0 and stats['busy_threads'] == 0
+        assert stats['rejected']['queue_timeout'] == 0
+    asyncio.run(scenario())
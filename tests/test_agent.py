@@ -1,7 +1,7 @@
 import pytest
 from fastapi.testclient import TestClient
 from src.main import app
-from unittest.mock import patch, AsyncMock
+from unittest.mock import patch, AsyncMock, MagicMock
 
 client = TestClient(app)
 
@@ -26,3 +26,106 @@ def test_simple_question_classification(monkeypatch):
         })
     # Even with mocked LLM, the endpoint should return 200
     assert response.status_code in [200, 500]  # 500 if Qdrant not running
+
+
+def test_steps_taken_reducer():
+    from src.agent.state import add_steps
+    steps = add_steps(['Classified as: complex'], ['Deadline check complete'])
+    assert steps == ['Classified as: complex', 'Deadline check complete']
+    assert add_steps(steps, []) == []    # a new request starts a fresh trace
+
+
+def test_simple_path_skips_llm_when_nothing_is_relevant():
+    from langchain_core.messages import HumanMessage
+    from src.agent import nodes
+    from src.agent.graph import build_agent_graph
+    from src.services.vector_store import SearchHit
+    classify = MagicMock(content='simple')
+    weak_hits = [SearchHit('1', 0.12, {'source': 'hk_audit.pdf'}),
+                 SearchHit('2', 0.08, {'source': 'sg_audit.pdf'})]
+    before = nodes.early_exit_stats.stats()['skipped_no_match']
+    with patch('src.agent.nodes.get_llm') as mock_llm, \
+            patch('src.agent.nodes.retrieve_documents', return_value=weak_hits):
+        mock_llm.return_value.invoke.return_value = classify
+        result = build_agent_graph().invoke(
+            {'messages': [HumanMessage(content='What is the capital of France?')],
+             'steps_taken': []},
+            {'configurable': {'thread_id': 'pytest-not-found'}})
+    # Only the classification call reached the LLM
+    assert mock_llm.return_value.invoke.call_count == 1
+    assert result['retrieval_status'] == 'no_match'
+    assert 'hk_audit.pdf (relevance: 0.12)' in result['final_response']
+    assert nodes.early_exit_stats.stats()['skipped_no_match'] == before + 1
+
+
+def test_requests_without_thread_id_get_their_own_thread():
+    graph = MagicMock()
+    graph.invoke.return_value = {'final_response': 'ok', 'steps_taken': []}
+    with patch('src.main.get_agent_graph', return_value=graph):
+        first = client.post('/agent/invoke', json={'message': 'What is HK-001?'})
+        second = client.post('/agent/invoke', json={'message': 'What is HK-001?'})
+    assert first.status_code == second.status_code == 200
+    assert first.json()['thread_id'] != second.json()['thread_id']
+
+
+def test_search_docs_records_document_search_failure():
+    from langchain_core.messages import HumanMessage
+    from src.agent import nodes
+    with patch('src.agent.nodes.embed_query', return_value=[1.0, 0.0]) as embed, \
+            patch('src.agent.nodes.retrieve_summaries', return_value=[]) as summary_search, \
+            patch('src.agent.nodes.retrieve_documents',
+                  side_effect=RuntimeError('qdrant down')) as document_search:
+        result = nodes.search_docs({'messages': [HumanMessage(content='Review HK findings')]})
+    assert result['retrieved_docs'] == []
+    assert result['steps_taken'] == ['Document search failed: qdrant down']
+    # The query is embedded once and shared by both searches
+    embed.assert_called_once()
+    assert summary_search.call_args.args[-1] == document_search.call_args.args[-1] == [1.0, 0.0]
+
+
+def test_search_docs_drills_into_chunks_behind_matched_summaries(tmp_path):
+    from langchain_core.messages import HumanMessage
+    from src.agent import nodes
+    from src.services.vector_store import EmbeddedVectorStore, SearchHit
+    store = EmbeddedVectorStore(str(tmp_path))
+    store.ensure_collection('audit_documents_hk', dim=4)
+    # c1 is the cover page; c4 matches best but no summary points to it
+    store.upsert('audit_documents_hk', ['c1', 'c2', 'c3', 'c4'],
+                 [[0, 1, 0, 0], [1, 1, 0, 0], [1, 0.2, 0, 0], [1, 0, 0, 0]],
+                 [{'page_content': f'raw chunk {i}', 'source': 'hk.pdf'} for i in (1, 2, 3, 4)])
+    summaries = [SearchHit('s1', 0.61, {'page_content': 'HK-2024-001 summary', 'source': 'hk.pdf',
+                                        'finding_id': 'HK-2024-001', 'jurisdiction': 'hk',
+                                        'chunk_ids': ['c1', 'c2', 'c3']}),
+                 SearchHit('s2', 0.05, {'page_content': 'unrelated', 'source': 'sg.pdf'})]
+    with patch('src.agent.nodes.embed_query', return_value=[1.0, 0.0, 0.0, 0.0]), \
+            patch('src.agent.nodes.retrieve_summaries', return_value=summaries), \
+            patch('src.agent.tools.get_vector_store', return_value=store), \
+            patch('src.agent.nodes.retrieve_documents') as fresh_search:
+        result = nodes.search_docs({'messages': [HumanMessage(content='Review HK-2024-001')]})
+    fresh_search.assert_not_called()
+    summary_doc, chunk_doc = result['retrieved_docs']
+    assert 'unrelated' not in summary_doc['content']      # below SUMMARY_MIN_SCORE
+    # Ranked against the query, not taken in document order
+    content = chunk_doc['content']
+    assert content.index('raw chunk 3') < content.index('raw chunk 2')
+    assert 'raw chunk 1' not in content and 'raw chunk 4' not in content
+    assert result['steps_taken'][-1] == 'Drilled into 2 raw chunks behind the matched summaries'
+
+    # When none of the summary's chunks is relevant, fall back to a fresh search
+    with patch('src.agent.nodes.embed_query', return_value=[0.0, 0.0, 1.0, 0.0]), \
+            patch('src.agent.nodes.retrieve_summaries', return_value=summaries), \
+            patch('src.agent.tools.get_vector_store', return_value=store), \
+            patch('src.agent.nodes.retrieve_documents', return_value=[]) as fresh_search:
+        result = nodes.search_docs({'messages': [HumanMessage(content='Review HK-2024-001')]})
+    fresh_search.assert_called_once()
+    assert result['steps_taken'][-1] == 'Document search returned no results'
+
+
+def test_approve_refuses_threads_that_are_not_paused():
+    graph = MagicMock()
+    graph.get_state.return_value = MagicMock(interrupts=())
+    with patch('src.main.get_agent_graph', return_value=graph):
+        response = client.post('/agent/approve', json={
+            'thread_id': 'pytest-not-paused', 'decision': 'approved'})
+    assert response.status_code == 409
+    graph.invoke.assert_not_called()
@@ -0,0 +1,41 @@
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+from langchain_core.documents import Document
+from src.services.rag_service import index_summaries, split_findings
+from src.services.vector_store import EmbeddedVectorStore
+
+SAMPLE_DOCS = Path(__file__).parent / 'sample_docs'
+
+
+def test_split_findings_one_segment_per_finding():
+    text = (SAMPLE_DOCS / 'hk_q3_audit_findings.txt').read_text()
+    segments = split_findings(text)
+    assert list(segments) == ['HK-2024-001', 'HK-2024-007']
+    assert 'Alice Chen' in segments['HK-2024-001']
+    assert 'Alice Chen' not in segments['HK-2024-007']
+
+
+
+def test_index_summaries_links_findings_to_their_own_chunks(tmp_path):
+    texts = ['Q3 2024 internal audit report. Cover page.',
+             'HK-2024-001 KYC refresh overdue. Owner: Alice Chen.',
+             'HK-2024-007 Sanctions screening gap. Owner: Bob Lee.',
+             'The remediation reuses the HK-2024-001 tooling.']
+    chunks = [Document(page_content=t, metadata={'jurisdiction': 'hk'}) for t in texts]
+    chunk_ids = ['c0', 'c1', 'c2', 'c3']
+    store = EmbeddedVectorStore(str(tmp_path))
+    with patch('src.services.rag_service.get_chat_model'), \
+            patch('src.services.rag_service.invoke_llm',
+                  side_effect=lambda llm, prompt, **kw: MagicMock(content=prompt[-60:])), \
+            patch('src.services.rag_service.embed_documents',
+                  side_effect=lambda emb, texts, **kw: [[1.0] * 1536 for _ in texts]):
+        assert index_summaries(store, None, 'hk_q3.pdf', chunks, chunk_ids) == 3
+
+    (_, _, payloads), = store.scroll('audit_summaries')
+    by_finding = {p['finding_id']: p for p in payloads}
+    assert by_finding[None]['summary_type'] == 'document'
+    assert by_finding[None]['chunk_ids'] == chunk_ids
+    assert by_finding['HK-2024-001']['chunk_ids'] == ['c1']
+    # The cross-reference in c3 belongs to HK-2024-007's segment
+    assert by_finding['HK-2024-007']['chunk_ids'] == ['c2', 'c3']
+    assert all(p['jurisdiction'] == 'hk' and p['source'] == 'hk_q3.pdf' for p in payloads)
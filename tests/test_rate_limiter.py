@@ -0,0 +1,74 @@
+import threading
+import time
+import pytest
+from src.services.rate_limiter import (
+    OpenAIScheduler, TokenBucket, PRIORITY_INTERACTIVE, PRIORITY_INGESTION
+)
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+def make_scheduler(**overrides):
+    params = dict(rpm=6000, tpm=1_000_000, max_concurrency=4,
+                  latency_target_seconds=10, max_retries=3,
+                  backoff_base_seconds=0.001, backoff_max_seconds=0.01)
+    params.update(overrides)
+    return OpenAIScheduler(**params)
+
+
+def test_token_bucket_wait_time():
+    bucket = TokenBucket(per_minute=60)
+    now = bucket.updated_at
+    assert bucket.wait_time(60, now) == 0
+    bucket.consume(60)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+
+
+def test_retries_429_and_halves_concurrency():
+    scheduler = make_scheduler()
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise FakeRateLimitError()
+        return 'ok'
+
+    assert scheduler.call(flaky) == 'ok'
+    assert len(calls) == 3
+    assert scheduler.rate_limited == 2
+    assert scheduler.concurrency_limit < 4
+
+
+def test_non_retryable_error_is_raised_immediately():
+    scheduler = make_scheduler()
+    with pytest.raises(ValueError):
+        scheduler.call(lambda: (_ for _ in ()).throw(ValueError('bad request')))
+    assert scheduler.retries == 0
+
+
+def test_interactive_calls_jump_the_queue():
+    scheduler = make_scheduler(max_concurrency=1)
+    order = []
+    gate = threading.Event()
+    blocker = threading.Thread(target=scheduler.call, args=(gate.wait,))
+    blocker.start()
+    while scheduler.in_flight == 0:
+        time.sleep(0.001)
+    threads = [
+        threading.Thread(target=scheduler.call,
+                         args=(lambda: order.append('ingestion'),),
+                         kwargs={'priority': PRIORITY_INGESTION}),
+        threading.Thread(target=scheduler.call,
+                         args=(lambda: order.append('interactive'),),
+                         kwargs={'priority': PRIORITY_INTERACTIVE}),
+    ]
+    for t in threads:
+        t.start()
+        time.sleep(0.05)
+    gate.set()
+    for t in [blocker] + threads:
+        t.join(timeout=5)
+    assert order == ['interactive', 'ingestion']
@@ -0,0 +1,29 @@
+from pathlib import Path
+import pytest
+from src.services.sharding import (
+    GENERAL_SHARD, detect_document_jurisdiction, route_query, shard_collection
+)
+
+SAMPLE_DOCS = Path(__file__).parent / 'sample_docs'
+
+
+def test_documents_go_to_their_dominant_jurisdiction():
+    hk = (SAMPLE_DOCS / 'hk_q3_audit_findings.txt').read_text()
+    sg = (SAMPLE_DOCS / 'sg_regulatory_summary.txt').read_text()
+    assert detect_document_jurisdiction(hk) == 'hk'     # cites FATF once, HKMA twice
+    assert detect_document_jurisdiction(sg) == 'sg'
+    assert detect_document_jurisdiction('Group travel policy') == GENERAL_SHARD
+
+
+def test_query_routing():
+    assert route_query('What does the HKMA guideline require?') == ['hk', GENERAL_SHARD]
+    assert set(route_query('Compare Hong Kong and Singapore findings')) == {'hk', 'sg', GENERAL_SHARD}
+    assert route_query('List all critical findings') == ['hk', 'sg', 'fatf', GENERAL_SHARD]
+    assert route_query('anything', ['SG']) == ['sg', GENERAL_SHARD]
+    with pytest.raises(ValueError):
+        route_query('anything', ['uk'])
+
+
+def test_general_shard_is_the_original_collection():
+    assert shard_collection(GENERAL_SHARD) == 'audit_documents'
+    assert shard_collection('hk') == 'audit_documents_hk'
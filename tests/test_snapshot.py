@@ -0,0 +1,65 @@
+import uuid
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+from src.services import snapshot
+from src.services.vector_store import QdrantVectorStore
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = QdrantClient(location=':memory:')
+    monkeypatch.setattr(snapshot, 'get_vector_store', lambda: QdrantVectorStore(client))
+    return client
+
+
+def test_export_import_roundtrip(client, tmp_path):
+    rng = np.random.default_rng(0)
+    client.create_collection('audit_documents_hk',
+                             vectors_config=VectorParams(size=8, distance=Distance.COSINE))
+    points = [PointStruct(id=str(uuid.uuid4()) if i % 2 else i,
+                          vector=rng.random(8).tolist(),
+                          payload={'page_content': f'chunk {i}', 'source': 'hk.pdf'})
+              for i in range(25)]
+    client.upsert('audit_documents_hk', points)
+    path = str(tmp_path / 'corpus.snap')
+
+    exported = snapshot.export_snapshot(path, batch_size=10)
+    assert exported['points'] == 25 and exported['dim'] == 8
+
+    client.delete_collection('audit_documents_hk')
+    imported = snapshot.import_snapshot(path, batch_size=7)
+    assert imported['points'] == 25
+    restored = {p.id: p for p in client.scroll('audit_documents_hk', limit=100,
+                                               with_vectors=True)[0]}
+    original = points[3]
+    assert restored[original.id].payload == original.payload
+    assert np.allclose(restored[original.id].vector,
+                       np.asarray(original.vector) / np.linalg.norm(original.vector), atol=1e-6)
+
+
+def test_import_refuses_other_embedding_model(client, tmp_path, monkeypatch):
+    path = str(tmp_path / 'empty.snap')
+    snapshot.export_snapshot(path, collections=[])
+    header = snapshot.read_header(path)
+    monkeypatch.setattr(snapshot.get_settings(), 'openai_embedding_model', 'other-model')
+    with pytest.raises(ValueError, match='embedded with'):
+        snapshot.import_snapshot(path)
+    assert header['count'] == 0
+
+
+def test_import_failure_surfaces_the_store_error(client, tmp_path, monkeypatch):
+    client.create_collection('audit_documents_hk',
+                             vectors_config=VectorParams(size=8, distance=Distance.COSINE))
+    client.upsert('audit_documents_hk', [PointStruct(id=i, vector=[float(i + 1)] * 8,
+                                                     payload={'n': i}) for i in range(5)])
+    path = str(tmp_path / 'corpus.snap')
+    snapshot.export_snapshot(path)
+
+    class DownStore(QdrantVectorStore):
+        def upsert(self, *args, **kwargs):
+            raise ConnectionError('qdrant is down')
+    monkeypatch.setattr(snapshot, 'get_vector_store', lambda: DownStore(client))
+    with pytest.raises(ConnectionError, match='qdrant is down'):
+        snapshot.import_snapshot(path)
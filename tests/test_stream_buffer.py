@@ -0,0 +1,44 @@
+import pytest
+from src.services.stream_buffer import StreamBufferStore, parse_last_event_id
+
+
+def test_replay_after_last_event_id():
+    store = StreamBufferStore(ttl_seconds=60)
+    run = store.create('thread-1', 'hello')
+    for i in range(3):
+        run.append({'node': f'n{i}'})
+    run_id, seq = parse_last_event_id(run.event_id(1))
+    assert store.get(run_id) is run
+    events, done = run.wait_for(seq, timeout=0)
+    assert len(events) == 2 and not done
+
+
+def test_finished_run_is_not_active():
+    store = StreamBufferStore(ttl_seconds=60)
+    run = store.create('thread-1', 'hello')
+    assert store.active_for_thread('thread-1') is run
+    run.finish()
+    assert store.active_for_thread('thread-1') is None
+    assert run.wait_for(0, timeout=0) == ([], True)
+
+
+def test_malformed_last_event_id():
+    with pytest.raises(ValueError):
+        parse_last_event_id('not-an-id')
+
+
+def test_async_wait_is_woken_by_a_writer_thread():
+    import asyncio
+    import threading
+    store = StreamBufferStore(ttl_seconds=60)
+    run = store.create('thread-1', 'hello')
+
+    async def follow():
+        writer = threading.Timer(0.05, lambda: run.append({'node': 'n0'}))
+        writer.start()
+        events, done = await run.wait_for_async(0, timeout=5)
+        assert len(events) == 1 and not done
+        assert await run.wait_for_async(1, timeout=0.01) == ([], False)    # heartbeat timeout
+        run.finish()
+        return await run.wait_for_async(1, timeout=5)
+    assert asyncio.run(follow()) == ([], True)
@@ -0,0 +1,28 @@
+from src.services.tracing import SpanRecorder, get_recorder, span, trace_context
+
+
+def test_spans_nest_under_the_request():
+    with trace_context('trace-test'):
+        with span('agent.invoke', kind='request'):
+            with span('qdrant.search', kind='qdrant') as attrs:
+                attrs['hits'] = 3
+    root, child = get_recorder().get('trace-test')
+    assert root['name'] == 'agent.invoke' and root['parent_id'] is None
+    assert child['parent_id'] == root['span_id']
+    assert child['trace_id'] == root['trace_id']
+    assert child['attributes']['hits'] == 3
+
+
+def test_span_without_context_is_not_recorded():
+    with span('orphan'):
+        pass
+    assert get_recorder().get('None') == []
+
+
+def test_recorder_is_bounded():
+    recorder = SpanRecorder(max_spans_per_thread=2, max_threads=1)
+    for i in range(3):
+        recorder.record('a', {'start': i})
+    recorder.record('b', {'start': 0})
+    assert recorder.get('a') == []
+    assert len(recorder.get('b')) == 1
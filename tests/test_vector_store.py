@@ -0,0 +1,123 @@
+import numpy as np
+from qdrant_client import QdrantClient
+from src.services.vector_store import EmbeddedVectorStore, QdrantVectorStore
+
+
+def _points(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    payloads = [{'page_content': f'chunk {i}', 'jurisdiction': 'hk' if i % 2 else 'sg'}
+                for i in range(n)]
+    return [f'id-{i}' for i in range(n)], vectors, payloads
+
+
+def test_embedded_search_matches_brute_force(tmp_path):
+    store = EmbeddedVectorStore(str(tmp_path))
+    store.ensure_collection('docs', dim=16)
+    ids, vectors, payloads = _points(200)
+    # Incremental appends, the way index_document adds one file at a time
+    store.upsert('docs', ids[:120], vectors[:120], payloads[:120])
+    store.upsert('docs', ids[120:], vectors[120:], payloads[120:])
+    query = vectors[7] + 0.01
+    hits = store.search('docs', query, top_k=5)
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(normed @ (query / np.linalg.norm(query))))[:5]
+    assert [h.id for h in hits] == [ids[i] for i in expected]
+    assert hits[0].id == 'id-7' and hits[0].payload['page_content'] == 'chunk 7'
+
+    filtered = store.search('docs', query, top_k=5, payload_filter={'jurisdiction': ['hk']})
+    assert filtered and all(h.payload['jurisdiction'] == 'hk' for h in filtered)
+
+
+def test_embedded_upsert_overwrites_and_persists(tmp_path):
+    store = EmbeddedVectorStore(str(tmp_path), dtype='int8')
+    store.ensure_collection('docs', dim=16)
+    ids, vectors, payloads = _points(10)
+    store.upsert('docs', ids, vectors, payloads)
+    store.upsert('docs', ['id-3'], vectors[:1], [{'page_content': 'updated'}])
+
+    reopened = EmbeddedVectorStore(str(tmp_path))
+    assert reopened.list_collections() == ['docs'] and reopened.count('docs') == 10
+    hit = reopened.search('docs', vectors[0], top_k=2)
+    assert {h.id for h in hit} == {'id-0', 'id-3'}
+    assert abs(hit[0].score - 1.0) < 0.02
+    batches = list(reopened.scroll('docs', batch_size=4))
+    assert sum(len(b[0]) for b in batches) == 10
+    assert batches[0][2][3] == {'page_content': 'updated'}
+
+
+def test_qdrant_store_applies_payload_filter():
+    store = QdrantVectorStore(QdrantClient(location=':memory:'))
+    store.ensure_collection('docs', dim=16)
+    ids, vectors, payloads = _points(20)
+    store.upsert('docs', list(range(20)), vectors, payloads)
+    hits = store.search('docs', vectors[2], top_k=3, payload_filter={'jurisdiction': ['sg']})
+    assert hits[0].id == 2 and all(h.payload['jurisdiction'] == 'sg' for h in hits)
+
+
+def test_search_can_be_restricted_to_point_ids(tmp_path):
+    ids, vectors, payloads = _points(20)
+    embedded = EmbeddedVectorStore(str(tmp_path))
+    qdrant = QdrantVectorStore(QdrantClient(location=':memory:'))
+    for store, point_ids in ((embedded, ids), (qdrant, list(range(20)))):
+        store.ensure_collection('docs', dim=16)
+        store.upsert('docs', point_ids, vectors, payloads)
+        allowed = [point_ids[i] for i in (3, 5, 8)]
+        hits = store.search('docs', vectors[2], top_k=5, ids=allowed)
+        assert sorted(h.id for h in hits) == sorted(allowed)
+        assert [h.score for h in hits] == sorted((h.score for h in hits), reverse=True)
+
+
+def test_embedded_search_does_not_hold_the_collection_lock(tmp_path):
+    import threading
+    store = EmbeddedVectorStore(str(tmp_path))
+    store.ensure_collection('docs', dim=16)
+    ids, vectors, payloads = _points(20)
+    store.upsert('docs', ids, vectors, payloads)
+    collection = store._collection('docs')
+    read_payload, lock_free = collection.payload, []
+
+    def payload(row):
+        # Another thread must be able to take the lock while hits are built
+        probe = threading.Thread(target=lambda: lock_free.append(
+            collection._lock.acquire(blocking=False) and collection._lock.release() is None))
+        probe.start()
+        probe.join()
+        return read_payload(row)
+    collection.payload = payload
+    assert store.search('docs', vectors[0], top_k=3)
+    assert lock_free and all(lock_free)
+
+
+def test_qdrant_store_caches_known_collections():
+    from unittest.mock import MagicMock
+    client = MagicMock()
+    client.collection_exists.return_value = True
+    store = QdrantVectorStore(client)
+    assert store.collection_exists('docs') and store.collection_exists('docs')
+    assert client.collection_exists.call_count == 1    # no round trip once known
+    store.delete_collection('docs')
+    client.collection_exists.return_value = False
+    assert not store.collection_exists('docs')
+
+
+def test_embedded_filter_reads_no_payloads_from_disk(tmp_path, monkeypatch):
+    store = EmbeddedVectorStore(str(tmp_path))
+    store.ensure_collection('docs', dim=16)
+    ids, vectors, payloads = _points(50)
+    store.upsert('docs', ids, vectors, payloads)
+    store.upsert('docs', ['id-4'], vectors[4:5], [{'page_content': 'moved', 'jurisdiction': 'hk'}])
+
+    reopened = EmbeddedVectorStore(str(tmp_path))
+    collection = reopened._collection('docs')
+    reads = []
+    original = collection.payload
+    monkeypatch.setattr(collection, 'payload', lambda row: reads.append(row) or original(row))
+    hits = reopened.search('docs', vectors[4], top_k=3, payload_filter={'jurisdiction': ['hk']})
+    # Only the returned hits are read; the filter comes from the index built at load
+    assert hits[0].id == 'id-4' and len(reads) == 3
+    assert all(h.payload['jurisdiction'] == 'hk' for h in hits)
+
+    # A field outside INDEXED_FIELDS is indexed from the log, latest entry per row
+    hits = reopened.search('docs', vectors[0], top_k=5, payload_filter={'page_content': ['moved']})
+    assert [h.id for h in hits] == ['id-4']